@@ -1,83 +1,225 @@
-import yaml
+import sys
+import time
+import signal
 import pygame
 import multiprocessing as mp
-import importlib
-from creatures import Worm
 
-from board import Board
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 
+from simulation import Simulation, load_config
+from viewport import Viewport
 
-class Application(object):
-    def __init__(self, config_path):
-        self.options = yaml.load(open(config_path))
-        self.ui_queue = mp.Queue(4096)
 
-    def init_board(self):
-        self.board = Board(
-            options=self.options["board"],
-            ui_queue=self.ui_queue
-        )
+class Application(Simulation):
+    def __init__(self, config_path, resume=None):
+        options = load_config(config_path)
+        self.render = options.get("render", dict())
 
-    def init_population(self):
-        for item in self.options.get("initial_populations"):
-            ps_def = self.options["position_strategies"][item["position"]["strategy"]]
-            mod = importlib.import_module(ps_def["module"])
-            obj_class = getattr(mod, ps_def["class"])
-            obj = obj_class(board=self.board, options=item["position"])
-            positions = obj.positions()
-
-            for n in range(item["count"]):
-                while True:
-                    position = next(positions)
-                    if self.board.is_free(position):
-                        worm = Worm(statics=item["genes"] if "genes" in item else dict())
-                        self.board.put(worm, position)
-                        break
+        view = self.render.get("viewport") or dict()
+        if view.get("enabled") and self.render.get("mode") != "framebuffer":
+            # queue brings only changes, renderer would need copy of board
+            raise ValueError("viewport needs framebuffer render mode")
 
-    def logic(self):
-        self.init_board()
-        self.init_population()
+        ui_queue = None
+        framebuffer = None
+        if self.render.get("mode") == "framebuffer":
+            from framebuffer import Framebuffer
+            framebuffer = Framebuffer(
+                options["board"]["width"],
+                options["board"]["height"]
+            )
+        else:
+            ui_queue = mp.Queue(4096)
+
+        super(Application, self).__init__(
+            options=options,
+            ui_queue=ui_queue,
+            framebuffer=framebuffer,
+            resume=resume
+        )
 
-        n = 0
-        while True:
-            n += 1
-            for creature in self.board.creatures:
-                creature.tick()
+    def logic(self):
+        # terminate() of render process ends simulation like normal exit
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        if self.ui_queue is not None:
+            # batches nobody reads any more must not keep exit waiting
+            self.ui_queue.cancel_join_thread()
 
-            creatures = self.board.creatures
-            print("Total:     {}".format(len(creatures)))
-            print("Alive:     {}".format(len(filter(lambda x: x.alive, creatures))))
-            print("No energy: {}".format(len(filter(lambda x: x.energy == 0.0, creatures))))
-            print("Turn:      {}".format(n))
+        self.init()
+        try:
+            while True:
+                self.step()
+        finally:
+            self.close()
 
     def run(self):
         """Entrypoint of application."""
         self.logic_process = mp.Process(target=self.logic)
+        self.logic_process.daemon = True
         self.logic_process.start()
 
         self.init_ui()
-        while True:
-            self.draw_ui()
+        try:
+            while self.draw_ui():
+                pass
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        """Stops logic process and releases what render process holds."""
+        if self.logic_process.is_alive():
+            self.logic_process.terminate()
+        self.logic_process.join(self.render.get("shutdown_timeout", 5))
+        if self.logic_process.is_alive():
+            # e.g. stuck in closing of sinks, its results are lost anyway
+            self.logic_process.kill()
+            self.logic_process.join()
+
+        if self.framebuffer is not None:
+            self.framebuffer.close()
+        if self.ui_queue is not None:
+            self.ui_queue.close()
+
+        pygame.quit()
 
     def init_ui(self):
-        self.ui = pygame.display.set_mode(
-            (
-                self.options["board"]["width"],
-                self.options["board"]["height"],
+        width = self.options["board"]["width"]
+        height = self.options["board"]["height"]
+
+        self.viewport = None
+        view = self.render.get("viewport") or dict()
+        if view.get("enabled"):
+            self.viewport = Viewport(
+                width, height,
+                view.get("width", 800),
+                view.get("height", 600),
+                minimap=view.get("minimap", 0),
+                reduce=view.get("reduce", "mean")
             )
-        )
+            self.viewport.fit()
+            self.moved = True
+            width, height = self.viewport.width, self.viewport.height
+
+        self.ui = pygame.display.set_mode((width, height))
+        self.clock = pygame.time.Clock()
+        self.drawn_turn = None
 
     def draw_ui(self):
-        for _ in range(100):
-            if self.ui_queue.empty():
+        """Draws one frame, returns False once window was closed."""
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                return False
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+                return False
+            if self.viewport is not None:
+                self.handle_view(event)
+
+        fps = self.render.get("fps", 30)
+        if self.framebuffer is not None:
+            changed = self.draw_framebuffer()
+        else:
+            # rest of frame is left for flip and events
+            changed = self.draw_queue(self.render.get("budget", 0.5) / fps)
+
+        if self.viewport is not None:
+            changed = self.draw_view(changed)
+
+        if changed:
+            pygame.display.flip()
+
+        self.clock.tick(fps)
+        return True
+
+    def draw_queue(self, budget):
+        """Paints batches arriving within budget seconds, True if any came.
+
+        Batches not drained in time stay in queue for next frame, so full
+        queue slows logic process down instead of renderer falling behind.
+        """
+        batches = []
+        deadline = time.time() + budget
+        while time.time() < deadline:
+            try:
+                batches.append(self.ui_queue.get_nowait())
+            except queue.Empty:
                 break
 
-            operation = self.ui_queue.get()
-            pos, color = operation
-            self.ui.set_at(pos, color)
+        if batches:
+            pixels = pygame.surfarray.pixels3d(self.ui)
+            for batch in batches:
+                pixels[batch[:, 0], batch[:, 1]] = batch[:, 2:]
+            # surface stays locked while pixels array exists
+            del pixels
 
-        pygame.display.flip()
-        for event in pygame.event.get():
-            pass
-#            if event.type == pygame.QUIT:
-#                running = False
+        return bool(batches)
+
+    def draw_framebuffer(self):
+        """Blits pixels when new turn was published, True if it was."""
+        # logic never waits for renderer, so frame may mix two turns
+        turn = self.framebuffer.turn
+        if turn == self.drawn_turn:
+            return False
+
+        self.drawn_turn = turn
+        if self.viewport is None:
+            pygame.surfarray.blit_array(self.ui, self.framebuffer.pixels)
+        return True
+
+    def draw_view(self, changed):
+        """Blits viewport when board changed or view moved, True if it did."""
+        if not changed and not self.moved:
+            return False
+
+        self.moved = False
+        pygame.surfarray.blit_array(
+            self.ui, self.viewport.draw(self.framebuffer.pixels)
+        )
+        return True
+
+    def handle_view(self, event):
+        """Pans and zooms viewport.
+
+        Arrows and dragging pan, wheel and +/- zoom, home shows whole
+        board and click on minimap centers view there.
+        """
+        view = self.viewport
+        middle = (view.width // 2, view.height // 2)
+        moved = True
+
+        if event.type == pygame.KEYDOWN:
+            step_x, step_y = view.width // 4, view.height // 4
+            if event.key == pygame.K_LEFT:
+                view.pan(-step_x, 0)
+            elif event.key == pygame.K_RIGHT:
+                view.pan(step_x, 0)
+            elif event.key == pygame.K_UP:
+                view.pan(0, -step_y)
+            elif event.key == pygame.K_DOWN:
+                view.pan(0, step_y)
+            elif event.key in (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS):
+                view.zoom_at(1, middle)
+            elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                view.zoom_at(-1, middle)
+            elif event.key == pygame.K_HOME:
+                view.fit()
+            else:
+                moved = False
+        elif event.type == pygame.MOUSEBUTTONDOWN:
+            cell = view.minimap_cell(event.pos)
+            if event.button == 4:
+                view.zoom_at(1, event.pos)
+            elif event.button == 5:
+                view.zoom_at(-1, event.pos)
+            elif event.button == 1 and cell is not None:
+                view.center(cell)
+            else:
+                moved = False
+        elif event.type == pygame.MOUSEMOTION and event.buttons[0]:
+            view.pan(-event.rel[0], -event.rel[1])
+        else:
+            moved = False
+
+        self.moved = self.moved or moved
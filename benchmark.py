@@ -0,0 +1,343 @@
+import sys
+import copy
+import json
+import math
+import time
+import random
+import argparse
+import platform
+import resource
+import itertools
+import multiprocessing as mp
+from creatures import Worm
+from stats import Statistics
+from simulation import Simulation, load_config
+
+SIZES = [100, 500, 1000, 2000]
+MEASURES = ["total", "alive", "no_energy"] + Statistics.EVENTS
+DENSITIES = [0.01, 0.1, 0.4, 0.8]
+MIXES = ["config", "uniform"]
+
+
+def mix_populations(base, mix):
+    """Returns populations of mix as (weight, genes) pairs.
+
+    Mix "config" follows initial_populations of base config, keeping their
+    genes and proportions, "uniform" is single population of random genes.
+    """
+    if mix == "uniform":
+        return [(1.0, dict())]
+
+    populations = base["initial_populations"]
+    total = float(sum(item["count"] for item in populations))
+    return [
+        (item["count"] / total, item.get("genes", dict()))
+        for item in populations
+    ]
+
+
+def case_options(base, case):
+    """Returns simulation options for single benchmark case."""
+    options = copy.deepcopy(base)
+    options["board"]["width"] = case["size"]
+    options["board"]["height"] = case["size"]
+    options["board"]["backend"] = case["backend"]
+    options.setdefault("engine", dict())["workers"] = case.get("workers", 1)
+
+    cells = case["size"] * case["size"]
+    options["initial_populations"] = [
+        dict(
+            count=int(round(weight * case["density"] * cells)),
+            genes=genes,
+            position=dict(strategy="random")
+        )
+        for weight, genes in mix_populations(base, case["mix"])
+    ]
+
+    return options
+
+
+def peak_memory():
+    """Returns peak resident memory of current process in megabytes."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return rss / (1024.0 * 1024.0 if sys.platform == "darwin" else 1024.0)
+
+
+def run_case(base, case):
+    """Runs single case and returns its measurements."""
+    simulation = Simulation(options=case_options(base, case), seed=case["seed"])
+
+    started = time.time()
+    simulation.init_board()
+    simulation.init_population()
+    setup = time.time() - started
+
+    turns = []
+    processed = 0
+    for _ in range(case["turns"]):
+        processed += simulation.board.census()["total"]
+        started = time.time()
+        simulation.step()
+        turns.append(time.time() - started)
+
+    elapsed = sum(turns)
+    result = dict(case)
+    result.update(
+        setup_seconds=setup,
+        turn_seconds=turns,
+        turns_per_second=len(turns) / elapsed if elapsed else None,
+        creatures_per_second=processed / elapsed if elapsed else None,
+        peak_memory_mb=peak_memory(),
+        genome_cache=Worm.gh().cache_info(),
+        summary=simulation.summary()
+    )
+    simulation.close()
+
+    return result
+
+
+def run_micro(base, count, seed):
+    """Measures Board.put/remove and genome decoding in isolation."""
+    options = copy.deepcopy(base)
+    options["initial_populations"] = []
+    simulation = Simulation(options=options, seed=seed)
+    simulation.init_board()
+    board = simulation.board
+
+    rg = random.Random(seed)
+    positions = rg.sample(
+        list(itertools.product(range(board.width), range(board.height))),
+        min(count, board.width * board.height)
+    )
+    worms = [Worm(rg=rg) for _ in positions]
+
+    started = time.time()
+    for worm, position in zip(worms, positions):
+        board.put(worm, position)
+    put = time.time() - started
+
+    started = time.time()
+    for position in positions:
+        board.remove(position)
+    remove = time.time() - started
+
+    genomes = [worm.genes for worm in worms]
+    started = time.time()
+    for genome in genomes:
+        Worm.gh().decode(genome)
+    decode = time.time() - started
+
+    started = time.time()
+    Worm.gh().decode_batch(genomes)
+    decode_batch = time.time() - started
+
+    return dict(
+        count=len(positions),
+        put_per_second=len(positions) / put,
+        remove_per_second=len(positions) / remove,
+        decode_per_second=len(genomes) / decode,
+        decode_batch_per_second=len(genomes) / decode_batch,
+    )
+
+
+def run_dynamics(base, backend, seed, turns):
+    """Returns census after turns, with events counted over whole run."""
+    options = copy.deepcopy(base)
+    options["board"]["backend"] = backend
+    options["statistics"] = None
+
+    simulation = Simulation(options=options, seed=seed)
+    simulation.init()
+    while simulation.turn < turns:
+        simulation.step()
+    simulation.close()
+
+    result = simulation.board.census()
+    result.update(simulation.board.stats.events)
+    return result
+
+
+def conformance(base, reference, candidate, seeds, turns):
+    """Compares population dynamics of two backends over runs of seeds.
+
+    Backends draw different random numbers, so single runs differ, but
+    means of every measure should agree within three standard errors
+    (plus 2% of mean, for measures which barely vary).
+    Returns (means, descriptions of measures which disagree).
+    """
+    runs = dict(
+        (backend, [run_dynamics(base, backend, seed, turns) for seed in seeds])
+        for backend in (reference, candidate)
+    )
+
+    means = dict()
+    mismatches = []
+    for measure in MEASURES:
+        stats = []
+        for backend in (reference, candidate):
+            values = [run.get(measure, 0) for run in runs[backend]]
+            mean = sum(values) / float(len(values))
+            variance = sum((x - mean) ** 2 for x in values) / max(len(values) - 1, 1)
+            stats.append((mean, variance / len(values)))
+
+        (a, a_var), (b, b_var) = stats
+        means[measure] = dict([(reference, a), (candidate, b)])
+        if abs(a - b) > 3 * math.sqrt(a_var + b_var) + 0.02 * abs(a):
+            mismatches.append("{}: {} {:.1f}, {} {:.1f}".format(
+                measure, reference, a, candidate, b
+            ))
+
+    return means, mismatches
+
+
+def call(connection, func, args):
+    """Sends result of func, or exception it raised, to connection."""
+    try:
+        connection.send((None, func(*args)))
+    except Exception as error:
+        connection.send((error, None))
+
+
+def isolated(func, *args):
+    """Calls func in fresh process, so peak memory is measured per case.
+
+    Process is not daemonic like ones of Pool, so it may start workers of
+    parallel engine.
+    """
+    parent, child = mp.Pipe()
+    process = mp.Process(target=call, args=(child, func, args))
+    process.start()
+    try:
+        error, result = parent.recv()
+    finally:
+        process.join()
+
+    if error is not None:
+        raise error
+    return result
+
+
+def case_key(case):
+    key = "{backend}/{mix}/{size}/{density}".format(**case)
+    if case.get("workers", 1) > 1:
+        key += "/{}w".format(case["workers"])
+    return key
+
+
+def compare(results, baseline, tolerance):
+    """Returns descriptions of cases slower than baseline by tolerance."""
+    previous = dict((case_key(x), x) for x in baseline["cases"])
+
+    regressions = []
+    for case in results["cases"]:
+        old = previous.get(case_key(case))
+        if not old or not old["turns_per_second"]:
+            continue
+
+        ratio = case["turns_per_second"] / old["turns_per_second"]
+        if ratio < 1.0 - tolerance:
+            regressions.append(
+                "{}: {:.2f} turns/s, baseline {:.2f} ({:.0%})".format(
+                    case_key(case),
+                    case["turns_per_second"],
+                    old["turns_per_second"],
+                    ratio
+                )
+            )
+
+    return regressions
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Measures turn throughput for board sizes and densities."
+    )
+    parser.add_argument("config", help="base YAML config")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--densities", type=float, nargs="+", default=DENSITIES)
+    parser.add_argument("--mixes", nargs="+", default=MIXES, choices=MIXES)
+    parser.add_argument("--backends", nargs="+", default=["dense"])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1],
+                        help="workers of engine, above 1 needs array backend")
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--micro", type=int, default=10000,
+                        help="creatures used by put/remove/decode benchmark")
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--baseline", default=None)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--conformance", type=int, default=0,
+                        help="seeds used to compare dynamics of backends")
+    parser.add_argument("--conformance-backends", nargs=2,
+                        default=["array", "kernel"],
+                        metavar=("REFERENCE", "CANDIDATE"))
+    parser.add_argument("--conformance-turns", type=int, default=200)
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    args = parse_args(argv)
+    base = load_config(args.config)
+
+    results = dict(
+        python=platform.python_version(),
+        machine=platform.machine(),
+        cpus=mp.cpu_count(),
+        started=time.time(),
+        cases=[],
+        micro=isolated(run_micro, base, args.micro, args.seed),
+    )
+
+    for backend, mix, size, density, workers in itertools.product(
+        args.backends, args.mixes, args.sizes, args.densities, args.workers
+    ):
+        case = dict(
+            backend=backend,
+            mix=mix,
+            size=size,
+            density=density,
+            workers=workers,
+            turns=args.turns,
+            seed=args.seed
+        )
+        result = isolated(run_case, base, case)
+        results["cases"].append(result)
+        print("{}: {:.2f} turns/s, {:.0f} creatures/s, {:.1f} MB".format(
+            case_key(case),
+            result["turns_per_second"] or 0.0,
+            result["creatures_per_second"] or 0.0,
+            result["peak_memory_mb"]
+        ))
+
+    mismatches = []
+    if args.conformance:
+        means, mismatches = conformance(
+            base,
+            args.conformance_backends[0],
+            args.conformance_backends[1],
+            [args.seed + n for n in range(args.conformance)],
+            args.conformance_turns
+        )
+        results["conformance"] = means
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+    for line in mismatches:
+        print("MISMATCH {}".format(line))
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+
+        for line in regressions:
+            print("REGRESSION {}".format(line))
+
+    if regressions or mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
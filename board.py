@@ -1,13 +1,321 @@
+import numpy as np
+from creatures import Creature, Worm
+from rng import Stream
+from stats import Statistics
+from registry import Registry
+from scheduler import Scheduler
+
+# code of field outside of board, see helpers.encode_field for others
+WALL = -1
+FREE, NONFREE, ALIVE, SAME, OPPOSITE = range(5)
+
+# field itself and its neighbours
+AROUND = [(0, 0)] + Creature.MOVES
+
+
+def neighbour_masks(codes, moves):
+    """Returns packed neighbourhood masks of all fields at once.
+
+    Every field gets five 8-bit masks (free, nonfree, alive, same species,
+    opposite gender), where bit k describes field shifted by moves[k].
+    Species and gender are compared with creature occupying the field.
+    """
+    width, height = codes.shape
+    padded = np.pad(codes, 1, mode="constant", constant_values=WALL)
+    own_gender = (codes >> 2) & 1
+    own_species = codes >> 3
+
+    result = np.zeros(codes.shape, dtype=np.int64)
+    for k, (dx, dy) in enumerate(moves):
+        other = padded[1 + dx:1 + dx + width, 1 + dy:1 + dy + height]
+        occupied = other > 0
+
+        masks = [
+            other == 0,
+            occupied,
+            occupied & ((other & 2) != 0),
+            occupied & ((other >> 3) == own_species),
+            occupied & (((other >> 2) & 1) != own_gender),
+        ]
+        for n, mask in enumerate(masks):
+            result |= mask.astype(np.int64) << (8 * n + k)
+
+    return result
+
+
+def unpack_masks(packed):
+    """Returns tuple of masks packed by neighbour_masks."""
+    return (
+        packed & 255,
+        (packed >> 8) & 255,
+        (packed >> 16) & 255,
+        (packed >> 24) & 255,
+        (packed >> 32) & 255,
+    )
+
+
 class Board(object):
-    def __init__(self, options, ui_queue):
+    def __init__(self, options, ui_queue=None, rg=None, framebuffer=None):
         self.width = options.get("width")
         self.height = options.get("height")
+        self.visit_order = options.get("visit_order", "sequential")
+        self.carrion_decay = options.get("carrion_decay", 0.0)
+        self.carrion_lifetime = options.get("carrion_lifetime", 0)
+        self.dormancy = options.get("dormancy", False)
         self.ui_queue = ui_queue
-        self.creatures = []
-        self.fields = [
+        self.framebuffer = framebuffer
+        self.recorder = None
+        self.rg = rg or Stream()
+        self.dirty = dict()
+        self.stats = Statistics()
+        self.creatures = Registry()
+        self.scheduler = Scheduler()
+        self.fields = self.create_fields()
+        self.create_grids()
+        self.turns = 0
+
+        # handles of creatures ticked every turn, dormant ones by position
+        self.active = set()
+        self.dormant = dict()
+
+    def create_fields(self):
+        """Returns empty grid of fields."""
+        return [
             [None for y in range(self.height)] for x in range(self.width)
         ]
 
+    def create_grids(self):
+        """Allocates arrays describing fields of board."""
+        self.codes = np.zeros((self.width, self.height), dtype=np.int8)
+        self.masks = None
+        self.stale = set()
+        # dormant creatures at and around every field
+        self.sleepers = np.zeros((self.width, self.height), dtype=np.int8)
+
+        # dead creatures leave only energy and turn of death, their species
+        # and gender stay in codes
+        self.carrion = np.zeros((self.width, self.height), dtype=np.float64)
+        self.carrion_since = np.zeros((self.width, self.height), dtype=np.int64)
+
+    def tick(self):
+        """Performs one turn of all creatures on board.
+
+        Active creatures present at the beginning of turn act in order of
+        their slots, or in random order if visit_order of board says so.
+        Creatures woken later in turn wait for next one, see wake.
+        """
+        self.turns += 1
+        self.decay()
+        self.refresh()
+
+        # creatures born from scheduled actions wait for next turn
+        handles = sorted(self.active)
+        if self.visit_order == "random":
+            self.rg.shuffle(handles)
+
+        for handle, action in self.scheduler.due(self.turns):
+            creature = self.creatures.get(handle)
+            if creature is not None:
+                self.wake(creature)
+
+            # creature could die of age while dormant
+            if self.creatures.get(handle) is not None:
+                creature.perform(action)
+
+        for handle in handles:
+            # creature could be eaten earlier in this turn
+            creature = self.creatures.get(handle)
+            if creature is not None:
+                creature.tick()
+
+    def state(self):
+        """Returns state of board and its creatures as dict of arrays."""
+        live = [
+            (slot, x) for slot, x in enumerate(self.creatures.items)
+            if x is not None
+        ]
+        creatures = [x for _, x in live]
+        events = self.scheduler.events()
+
+        state = dict(
+            turns=np.array(self.turns),
+            slots=np.array([slot for slot, _ in live], dtype=np.int64),
+            generations=np.array(self.creatures.generations, dtype=np.int64),
+            released=np.array(self.creatures.released, dtype=np.int64),
+            x=np.array([x.position[0] for x in creatures], dtype=np.int32),
+            y=np.array([x.position[1] for x in creatures], dtype=np.int32),
+            genes=np.array([x.genes for x in creatures], dtype=np.uint64),
+            pregnant=np.array(
+                [x.genetic_material is not None for x in creatures],
+                dtype=np.bool_
+            ),
+            material=np.array(
+                [x.genetic_material or 0 for x in creatures],
+                dtype=np.uint64
+            ),
+            slept=np.array(
+                [-1 if x.slept is None else x.slept for x in creatures],
+                dtype=np.int64
+            ),
+            events_turn=np.array([x[0] for x in events], dtype=np.int64),
+            events_slot=np.array([x[1][0] for x in events], dtype=np.int64),
+            events_generation=np.array(
+                [x[1][1] for x in events],
+                dtype=np.int64
+            ),
+            events_action=np.array([x[2] for x in events], dtype=np.str_),
+        )
+        for name, dtype in Worm.STATE:
+            state[name] = np.array(
+                [getattr(x, name) for x in creatures],
+                dtype=dtype
+            )
+
+        state.update(self.grid_state())
+        state.update(self.stats.state())
+        return state
+
+    def grid_state(self):
+        """Returns arrays describing fields, part of state."""
+        return dict(
+            codes=self.codes.copy(),
+            carrion=self.carrion.copy(),
+            carrion_since=self.carrion_since.copy(),
+        )
+
+    def restore(self, state):
+        """Sets empty board to state made by Board.state."""
+        self.turns = int(state["turns"])
+        self.restore_grids(state)
+        self.creatures.generations = state["generations"].tolist()
+        self.creatures.items = [None] * len(self.creatures.generations)
+        self.creatures.released = state["released"].tolist()
+
+        columns = [state[name].tolist() for name, _ in Worm.STATE]
+        slept = state["slept"].tolist()
+        for n, slot in enumerate(state["slots"].tolist()):
+            creature = Worm(genes=int(state["genes"][n]))
+            for (name, _), column in zip(Worm.STATE, columns):
+                setattr(creature, name, column[n])
+            if state["pregnant"][n]:
+                creature.genetic_material = int(state["material"][n])
+
+            x, y = int(state["x"][n]), int(state["y"][n])
+            creature.position = (x, y)
+            creature.board = self
+            creature.handle = (slot, self.creatures.generations[slot])
+            self.creatures.items[slot] = creature
+            self.creatures.count += 1
+            self.place(creature.position, creature)
+            if slept[n] < 0:
+                self.active.add(creature.handle)
+            else:
+                creature.slept = slept[n]
+                self.dormant[creature.position] = creature
+                self.count_sleeper(creature.position, 1)
+            self.paint(creature.position, creature.color)
+
+        for turn, slot, generation, action in zip(
+            state["events_turn"].tolist(),
+            state["events_slot"].tolist(),
+            state["events_generation"].tolist(),
+            state["events_action"].tolist()
+        ):
+            self.scheduler.schedule(turn, (slot, generation), action)
+
+        self.stats.restore(state)
+
+    def restore_grids(self, state):
+        """Sets arrays describing fields from state made by grid_state."""
+        self.codes[:] = state["codes"]
+        self.carrion[:] = state["carrion"]
+        self.carrion_since[:] = state["carrion_since"]
+        for x, y in zip(*np.nonzero((self.codes > 0) & (self.codes & 2 == 0))):
+            self.paint((int(x), int(y)), (50, 50, 50))
+
+        self.masks = None
+
+    def place(self, position, creature):
+        """Stores creature in field, without any other bookkeeping."""
+        x, y = position
+        self.fields[x][y] = creature
+
+    def census(self):
+        """Returns counts of creatures on board."""
+        return self.stats.census()
+
+    def refresh(self):
+        """Recomputes all neighbourhood masks when many fields changed."""
+        # lazy refresh is cheaper only while few fields changed
+        if self.masks is None or len(self.stale) * 100 > self.codes.size:
+            self.scan()
+
+    def scan(self, start=0, stop=None):
+        """Computes neighbourhood masks of fields with x in [start, stop)."""
+        stop = self.width if stop is None else stop
+        if self.masks is None:
+            self.masks = np.zeros(self.codes.shape, dtype=np.int64)
+
+        # one column of neighbours on both sides, unless it is off board
+        low = max(start - 1, 0)
+        high = min(stop + 1, self.width)
+        masks = neighbour_masks(self.codes[low:high], Creature.MOVES)
+        self.masks[start:stop] = masks[start - low:stop - low]
+        self.stale.clear()
+
+    def scan_field(self, position):
+        """Computes packed neighbourhood masks of single field."""
+        x, y = position
+        own = self.codes.item(x, y)
+
+        result = 0
+        for k, (dx, dy) in enumerate(Creature.MOVES):
+            if not self.is_correct_position((x + dx, y + dy)):
+                continue
+
+            other = self.codes.item(x + dx, y + dy)
+            if other == 0:
+                result |= 1 << (8 * FREE + k)
+                continue
+
+            result |= 1 << (8 * NONFREE + k)
+            if other & 2:
+                result |= 1 << (8 * ALIVE + k)
+            if (other >> 3) == (own >> 3):
+                result |= 1 << (8 * SAME + k)
+            if ((other >> 2) & 1) != ((own >> 2) & 1):
+                result |= 1 << (8 * OPPOSITE + k)
+
+        return result
+
+    def neighbourhood(self, position):
+        """Returns (free, nonfree, alive, same, opposite) masks of field.
+
+        Bit k of each mask describes field at Creature.MOVES[k] from position.
+        """
+        if self.masks is None:
+            self.scan()
+
+        if position in self.stale:
+            self.stale.discard(position)
+            self.masks[position] = self.scan_field(position)
+
+        return unpack_masks(self.masks.item(position))
+
+    def mark(self, position, code):
+        """Stores code of field and invalidates masks around it."""
+        x, y = position
+        self.stats.replace(self.codes.item(x, y), code)
+        self.codes[x, y] = code
+
+        if self.dormant and self.sleepers.item(x, y):
+            self.rouse(position)
+
+        if self.masks is not None:
+            self.stale.add(position)
+            for dx, dy in Creature.MOVES:
+                self.stale.add((x + dx, y + dy))
+
     def is_correct_position(self, position):
         """Checks if position is placed on board."""
 
@@ -21,13 +329,21 @@ class Board(object):
 
         return True
 
+    def wrap(self, position):
+        """Returns field at position, which may lie past edge of board.
+
+        Only boards wrapping around at edges map such positions onto
+        fields, position of other boards is returned as it is.
+        """
+        return position
+
     def is_free(self, position):
         """Checks if specified position does not contain any creature."""
 
         x, y = position
         return (
             self.is_correct_position(position) and
-            self.fields[x][y] is None
+            self.codes.item(x, y) == 0
         )
 
     def at(self, position):
@@ -35,39 +351,161 @@ class Board(object):
         x, y = position
         return self.fields[x][y]
 
+    def paint(self, position, color):
+        """Remembers new color of field until next flush."""
+        if self.framebuffer is not None:
+            self.framebuffer.pixels[position] = color
+        if self.ui_queue is not None or self.recorder is not None:
+            self.dirty[position] = color
+
+    def flush(self):
+        """Sends colors changed since last flush to UI as single array.
+
+        Rows of array are (x, y, r, g, b), one per changed field, holding
+        only the last color painted there. Framebuffer is just marked as
+        complete, as fields are painted into it directly. Recorder gets
+        batch of every turn, even empty one.
+        """
+        if self.framebuffer is not None:
+            self.framebuffer.publish()
+
+        batch = None
+        if self.dirty:
+            batch = np.empty((len(self.dirty), 5), dtype=np.int32)
+            batch[:, :2] = list(self.dirty.keys())
+            batch[:, 2:] = list(self.dirty.values())
+            self.dirty.clear()
+
+            if self.ui_queue is not None:
+                self.ui_queue.put(batch)
+
+        if self.recorder is not None:
+            self.recorder.record(self.turns, batch)
+
     def put(self, creature, position):
         """Puts new creature on board."""
 
         x, y = position
         creature.position = position
         creature.board = self
-        self.creatures.append(creature)
+        creature.handle = self.creatures.insert(creature)
+        self.active.add(creature.handle)
         self.fields[x][y] = creature
-        self.ui_queue.put(
-            (
-                creature.position,
-                creature.color
-            )
-        )
+        self.mark(position, creature.code)
+        self.stats.starve(False, creature.starving)
+        self.paint(creature.position, creature.color)
+
+        if not creature.alive:
+            # dead from start, e.g. carrion of initial population
+            self.bury(creature)
 
     def remove(self, position):
         """Removes creature from board."""
 
         x, y = position
-        self.creatures.remove(self.fields[x][y])
+        creature = self.fields[x][y]
+        if creature is None:
+            self.consume(position)
+            return
+
+        self.creatures.remove(creature.handle)
+        self.active.discard(creature.handle)
+        if self.dormant.pop(position, None) is not None:
+            self.count_sleeper(position, -1)
         self.fields[x][y] = None
-        self.ui_queue.put((position, (0, 0, 0)))
+        if self.codes.item(x, y) & 2:
+            self.stats.event("deaths")
+        self.stats.starve(creature.starving, False)
+        self.mark(position, 0)
+        self.paint(position, (0, 0, 0))
+
+    def bury(self, creature):
+        """Replaces dead creature by carrion keeping its energy."""
+
+        x, y = creature.position
+        self.creatures.remove(creature.handle)
+        self.active.discard(creature.handle)
+        if self.dormant.pop(creature.position, None) is not None:
+            self.count_sleeper(creature.position, -1)
+        self.fields[x][y] = None
+        self.carrion[x, y] = creature.energy
+        self.carrion_since[x, y] = self.turns
+        self.mark(creature.position, creature.code)
+        self.paint(creature.position, creature.color)
+
+    def consume(self, position):
+        """Removes carrion from field and returns its energy."""
+
+        x, y = position
+        energy = self.carrion.item(x, y)
+        self.carrion[x, y] = 0.0
+        self.stats.starve(energy == 0.0, False)
+        self.mark(position, 0)
+        self.paint(position, (0, 0, 0))
+        return energy
+
+    def decay(self):
+        """Drains energy of carrion and removes carrion past its lifetime."""
+
+        if self.carrion_decay:
+            self.carrion *= 1.0 - self.carrion_decay
+
+        if self.carrion_lifetime:
+            expired = (
+                (self.codes > 0) & (self.codes & 2 == 0) &
+                (self.turns - self.carrion_since >= self.carrion_lifetime)
+            )
+            for x, y in zip(*np.nonzero(expired)):
+                self.consume((int(x), int(y)))
+
+    def sleep(self, creature):
+        """Stops ticking creature until something changes around it.
+
+        Wake is also planned for turn in which creature would die of age,
+        turns skipped meanwhile are applied at once by wake.
+        """
+        self.active.discard(creature.handle)
+        self.dormant[creature.position] = creature
+        self.count_sleeper(creature.position, 1)
+        creature.slept = self.turns
+        creature.schedule("wake", creature.turns_left + 1)
+
+    def wake(self, creature):
+        """Makes dormant creature active, current turn counts as skipped."""
+        if self.dormant.pop(creature.position, None) is None:
+            return
+
+        self.count_sleeper(creature.position, -1)
+        self.active.add(creature.handle)
+        turns = self.turns - creature.slept
+        creature.slept = None
+        creature.idle(turns)
+
+    def count_sleeper(self, position, change):
+        """Adds change to counts of dormant creatures around position."""
+        x, y = position
+        self.sleepers[max(x - 1, 0):x + 2, max(y - 1, 0):y + 2] += change
+
+    def rouse(self, position):
+        """Wakes dormant creatures at position and around it."""
+        x, y = position
+        for dx, dy in AROUND:
+            creature = self.dormant.get((x + dx, y + dy))
+            if creature is not None:
+                self.wake(creature)
 
     def check_out(self, creature):
         """Clears current position of creature on board."""
 
         x, y = creature.position
         self.fields[x][y] = None
-        self.ui_queue.put((creature.position, (0, 0, 0)))
+        self.mark(creature.position, 0)
+        self.paint(creature.position, (0, 0, 0))
 
     def check_in(self, creature):
         """Paints current position of creature on board."""
 
         x, y = creature.position
         self.fields[x][y] = creature
-        self.ui_queue.put((creature.position, creature.color))
+        self.mark(creature.position, creature.code)
+        self.paint(creature.position, creature.color)
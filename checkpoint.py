@@ -0,0 +1,70 @@
+import os
+import json
+import numpy as np
+import multiprocessing as mp
+
+
+def rng_state(prefix, rg):
+    """Returns state of rng.Stream as dict of arrays."""
+    return {prefix + "_rng": np.array(json.dumps(rg.getstate()))}
+
+
+def set_rng_state(prefix, rg, state):
+    """Sets state of rng.Stream from dict made by rng_state."""
+    rg.setstate(json.loads(str(state[prefix + "_rng"])))
+
+
+def write(path, state):
+    """Writes state to .npz file at path, replacing it atomically."""
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as f:
+        np.savez_compressed(f, **state)
+    os.rename(temporary, path)
+
+
+def read(path):
+    """Returns state read from file written by write."""
+    with np.load(path) as data:
+        return dict((name, data[name]) for name in data.files)
+
+
+class Checkpointer(object):
+    """Saves state of simulation every given number of turns.
+
+    File is written by forked process, which sees copy-on-write snapshot
+    of parent, so loop of turns waits only for fork itself. Shared arrays
+    of parallel engine are not copied on write, so with engine state is
+    collected before fork and only compressing and writing is left to child.
+    """
+
+    def __init__(self, path, every):
+        self.path = path
+        self.every = every
+        self.process = None
+
+    def due(self, turn):
+        return bool(self.every) and turn % self.every == 0
+
+    def save(self, simulation):
+        """Starts writing state of simulation in background."""
+        self.wait()
+
+        if simulation.engine is not None:
+            args = (self.path, simulation.state())
+        else:
+            args = (self.path, simulation)
+
+        ctx = mp.get_context("fork")
+        self.process = ctx.Process(target=self.write, args=args)
+        self.process.start()
+
+    def write(self, path, state):
+        if not isinstance(state, dict):
+            state = state.state()
+        write(path, state)
+
+    def wait(self):
+        """Waits until last started write finishes."""
+        if self.process is not None:
+            self.process.join()
+            self.process = None
@@ -0,0 +1,363 @@
+import numpy as np
+from board import AROUND, FREE, NONFREE, ALIVE, SAME, OPPOSITE, WALL
+from board import Board, neighbour_masks, unpack_masks
+from creatures import Creature
+
+
+class Chunk(object):
+    """Square part of ChunkedBoard, with arrays describing its fields."""
+
+    __slots__ = (
+        "fields", "codes", "carrion", "carrion_since", "masks", "stale",
+        "count",
+    )
+
+    def __init__(self, size):
+        self.fields = [[None] * size for _ in range(size)]
+        self.codes = np.zeros((size, size), dtype=np.int8)
+        self.carrion = np.zeros((size, size), dtype=np.float64)
+        self.carrion_since = np.zeros((size, size), dtype=np.int64)
+        # computed on first use, see ChunkedBoard.neighbourhood
+        self.masks = None
+        self.stale = set()
+        # non-free fields, chunk is dropped when it gets to zero
+        self.count = 0
+
+
+class ChunkedBoard(Board):
+    """Board keeping fields in chunks allocated only where something lives.
+
+    Fields are grouped into squares of chunk_size x chunk_size and every
+    chunk holds creatures, codes, carrion and neighbourhood masks of its
+    fields in small arrays of its own. Chunk is allocated when its first
+    field gets occupied and dropped when its last field becomes free, so
+    memory follows occupied area instead of size of board. With toroidal
+    option edges of board wrap around, positions of creatures are always
+    kept on board.
+    """
+
+    def __init__(self, options, ui_queue=None, rg=None, framebuffer=None):
+        self.chunk_size = options.get("chunk_size", 64)
+        self.toroidal = options.get("toroidal", False)
+        if self.chunk_size & (self.chunk_size - 1):
+            raise ValueError("chunk_size has to be power of two")
+        # chunk and field within it are taken from bits of coordinates
+        self.shift = self.chunk_size.bit_length() - 1
+        self.low = self.chunk_size - 1
+        super(ChunkedBoard, self).__init__(
+            options=options,
+            ui_queue=ui_queue,
+            rg=rg,
+            framebuffer=framebuffer
+        )
+
+    def create_fields(self):
+        # fields live in chunks
+        return None
+
+    def create_grids(self):
+        self.chunks = dict()
+
+    def key(self, position):
+        """Returns key of chunk holding field."""
+        return position[0] >> self.shift, position[1] >> self.shift
+
+    def chunk(self, position, create=False):
+        """Returns (chunk, x, y) of field, with chunk None if missing."""
+        x, y = position
+        key = (x >> self.shift, y >> self.shift)
+        chunk = self.chunks.get(key)
+        if chunk is None and create:
+            chunk = self.chunks[key] = Chunk(self.chunk_size)
+
+        return chunk, x & self.low, y & self.low
+
+    def code(self, position):
+        """Returns code of field on board, 0 for fields without chunk."""
+        chunk, x, y = self.chunk(position)
+        return 0 if chunk is None else chunk.codes.item(x, y)
+
+    def wrap(self, position):
+        if not self.toroidal:
+            return position
+
+        x, y = position
+        return x % self.width, y % self.height
+
+    def is_correct_position(self, position):
+        x, y = position
+        return self.toroidal or (
+            0 <= x < self.width and 0 <= y < self.height
+        )
+
+    def is_free(self, position):
+        return (
+            self.is_correct_position(position) and
+            self.code(self.wrap(position)) == 0
+        )
+
+    def at(self, position):
+        chunk, x, y = self.chunk(self.wrap(position))
+        return None if chunk is None else chunk.fields[x][y]
+
+    def place(self, position, creature):
+        chunk, x, y = self.chunk(position, create=True)
+        chunk.fields[x][y] = creature
+
+    def refresh(self):
+        # lazy refresh is cheaper only while few fields of chunk changed
+        limit = self.chunk_size * self.chunk_size
+        for key, chunk in self.chunks.items():
+            if chunk.masks is not None and len(chunk.stale) * 100 > limit:
+                self.scan_chunk(key, chunk)
+
+    def scan(self, start=0, stop=None):
+        for key, chunk in self.chunks.items():
+            self.scan_chunk(key, chunk)
+
+    def scan_chunk(self, key, chunk):
+        """Computes neighbourhood masks of all fields of chunk."""
+        size = self.chunk_size
+        left, top = key[0] * size, key[1] * size
+
+        # chunk with one field of its neighbours on every side
+        codes = np.zeros((size + 2, size + 2), dtype=np.int8)
+        codes[1:-1, 1:-1] = chunk.codes
+        border = [
+            (x, y)
+            for x in range(-1, size + 1)
+            for y in ((-1, size) if 0 <= x < size else range(-1, size + 1))
+        ]
+        if left + size > self.width or top + size > self.height:
+            # fields of chunk past edge of board are walls or wrap around
+            border.extend(
+                (x, y) for x in range(size) for y in range(size)
+                if left + x >= self.width or top + y >= self.height
+            )
+
+        for x, y in border:
+            position = (left + x, top + y)
+            if self.is_correct_position(position):
+                codes[x + 1, y + 1] = self.code(self.wrap(position))
+            else:
+                codes[x + 1, y + 1] = WALL
+
+        chunk.masks = neighbour_masks(codes, Creature.MOVES)[1:-1, 1:-1]
+        chunk.stale.clear()
+
+    def scan_field(self, position):
+        x, y = position
+        own = self.code(position)
+
+        result = 0
+        for k, (dx, dy) in enumerate(Creature.MOVES):
+            other = (x + dx, y + dy)
+            if not self.is_correct_position(other):
+                continue
+
+            other = self.code(self.wrap(other))
+            if other == 0:
+                result |= 1 << (8 * FREE + k)
+                continue
+
+            result |= 1 << (8 * NONFREE + k)
+            if other & 2:
+                result |= 1 << (8 * ALIVE + k)
+            if (other >> 3) == (own >> 3):
+                result |= 1 << (8 * SAME + k)
+            if ((other >> 2) & 1) != ((own >> 2) & 1):
+                result |= 1 << (8 * OPPOSITE + k)
+
+        return result
+
+    def neighbourhood(self, position):
+        x, y = position
+        chunk = self.chunks.get((x >> self.shift, y >> self.shift))
+        x, y = x & self.low, y & self.low
+        if chunk is None:
+            return unpack_masks(self.scan_field(position))
+
+        if chunk.masks is None:
+            self.scan_chunk(self.key(position), chunk)
+        elif position in chunk.stale:
+            chunk.stale.discard(position)
+            chunk.masks[x, y] = self.scan_field(position)
+
+        return unpack_masks(chunk.masks.item(x, y))
+
+    def mark(self, position, code):
+        chunk, x, y = self.chunk(position, create=True)
+        old = chunk.codes.item(x, y)
+        self.stats.replace(old, code)
+        chunk.codes[x, y] = code
+        chunk.count += (code != 0) - (old != 0)
+        if not chunk.count:
+            del self.chunks[self.key(position)]
+
+        if self.dormant:
+            self.rouse(position)
+
+        px, py = position
+        if (
+            0 < x < self.low and 0 < y < self.low and
+            px + 1 < self.width and py + 1 < self.height
+        ):
+            # neighbours are on board and in the same chunk
+            if chunk.count and chunk.masks is not None:
+                chunk.stale.update((px + dx, py + dy) for dx, dy in AROUND)
+            return
+
+        for dx, dy in AROUND:
+            other = (px + dx, py + dy)
+            if not self.is_correct_position(other):
+                continue
+
+            other = self.wrap(other)
+            chunk = self.chunk(other)[0]
+            if chunk is not None and chunk.masks is not None:
+                chunk.stale.add(other)
+
+    def count_sleeper(self, position, change):
+        # rouse looks dormant creatures up directly
+        pass
+
+    def rouse(self, position):
+        x, y = position
+        dormant = self.dormant
+        wrap = self.wrap if self.toroidal else None
+        for dx, dy in AROUND:
+            other = (x + dx, y + dy)
+            creature = dormant.get(wrap(other) if wrap else other)
+            if creature is not None:
+                self.wake(creature)
+
+    def put(self, creature, position):
+        position = self.wrap(position)
+        creature.position = position
+        creature.board = self
+        creature.handle = self.creatures.insert(creature)
+        self.active.add(creature.handle)
+        self.place(position, creature)
+        self.mark(position, creature.code)
+        self.stats.starve(False, creature.starving)
+        self.paint(position, creature.color)
+
+        if not creature.alive:
+            # dead from start, e.g. carrion of initial population
+            self.bury(creature)
+
+    def remove(self, position):
+        position = self.wrap(position)
+        creature = self.at(position)
+        if creature is None:
+            self.consume(position)
+            return
+
+        self.creatures.remove(creature.handle)
+        self.active.discard(creature.handle)
+        self.dormant.pop(position, None)
+        self.place(position, None)
+        if self.code(position) & 2:
+            self.stats.event("deaths")
+        self.stats.starve(creature.starving, False)
+        self.mark(position, 0)
+        self.paint(position, (0, 0, 0))
+
+    def bury(self, creature):
+        chunk, x, y = self.chunk(creature.position)
+        self.creatures.remove(creature.handle)
+        self.active.discard(creature.handle)
+        self.dormant.pop(creature.position, None)
+        chunk.fields[x][y] = None
+        chunk.carrion[x, y] = creature.energy
+        chunk.carrion_since[x, y] = self.turns
+        self.mark(creature.position, creature.code)
+        self.paint(creature.position, creature.color)
+
+    def consume(self, position):
+        position = self.wrap(position)
+        chunk, x, y = self.chunk(position)
+        energy = chunk.carrion.item(x, y)
+        chunk.carrion[x, y] = 0.0
+        self.stats.starve(energy == 0.0, False)
+        self.mark(position, 0)
+        self.paint(position, (0, 0, 0))
+        return energy
+
+    def decay(self):
+        if not self.carrion_decay and not self.carrion_lifetime:
+            return
+
+        expired = []
+        for (kx, ky), chunk in self.chunks.items():
+            if self.carrion_decay:
+                chunk.carrion *= 1.0 - self.carrion_decay
+
+            if self.carrion_lifetime:
+                xs, ys = np.nonzero(
+                    (chunk.codes > 0) & (chunk.codes & 2 == 0) &
+                    (self.turns - chunk.carrion_since >= self.carrion_lifetime)
+                )
+                expired.extend(zip(
+                    (xs + kx * self.chunk_size).tolist(),
+                    (ys + ky * self.chunk_size).tolist()
+                ))
+
+        # chunks are dropped by consume, so not while iterating them
+        for position in expired:
+            self.consume(position)
+
+    def check_out(self, creature):
+        self.place(creature.position, None)
+        self.mark(creature.position, 0)
+        self.paint(creature.position, (0, 0, 0))
+
+    def check_in(self, creature):
+        creature.position = self.wrap(creature.position)
+        self.place(creature.position, creature)
+        self.mark(creature.position, creature.code)
+        self.paint(creature.position, creature.color)
+
+    def grid_state(self):
+        """Returns non-free fields as arrays, part of state."""
+        cells = []
+        for (kx, ky), chunk in self.chunks.items():
+            xs, ys = np.nonzero(chunk.codes)
+            codes = chunk.codes[xs, ys]
+            cells.append((
+                xs + kx * self.chunk_size,
+                ys + ky * self.chunk_size,
+                codes,
+                chunk.carrion[xs, ys],
+                # left over from earlier carrion on fields of living ones
+                np.where(codes & 2, 0, chunk.carrion_since[xs, ys]),
+            ))
+
+        columns = [
+            ("cells_x", np.int64), ("cells_y", np.int64),
+            ("cells_code", np.int8), ("cells_carrion", np.float64),
+            ("cells_since", np.int64),
+        ]
+        return dict(
+            (name, np.concatenate(
+                [np.zeros(0, dtype=dtype)] + [x[n] for x in cells]
+            ).astype(dtype))
+            for n, (name, dtype) in enumerate(columns)
+        )
+
+    def restore_grids(self, state):
+        self.chunks = dict()
+        for x, y, code, carrion, since in zip(
+            state["cells_x"].tolist(),
+            state["cells_y"].tolist(),
+            state["cells_code"].tolist(),
+            state["cells_carrion"].tolist(),
+            state["cells_since"].tolist()
+        ):
+            chunk, lx, ly = self.chunk((x, y), create=True)
+            chunk.codes[lx, ly] = code
+            chunk.carrion[lx, ly] = carrion
+            chunk.carrion_since[lx, ly] = since
+            chunk.count += 1
+            if not code & 2:
+                self.paint((x, y), (50, 50, 50))
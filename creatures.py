@@ -1,11 +1,25 @@
 import helpers as h
 from genome import GenomeHandler
+import math
 import random
 import itertools
 
 
+MOVES = [x for x in itertools.product([-1, 0, 1], repeat=2) if sum(x) != 0]
+
+# moves selected by every possible neighbourhood mask
+MASKED_MOVES = [
+    [m for k, m in enumerate(MOVES) if mask & (1 << k)]
+    for mask in range(1 << len(MOVES))
+]
+
+
 class Creature(object):
-    MOVES = [x for x in itertools.product([-1, 0, 1], repeat=2) if sum(x) != 0]
+    MOVES = MOVES
+
+    __slots__ = (
+        "genes", "data", "age", "position", "board", "handle", "slept",
+    )
 
     @property
     def color(self):
@@ -17,20 +31,31 @@ class Creature(object):
         """Returns description of genes."""
         raise NotImplementedError()
 
+    @classmethod
+    def traits(cls):
+        """Returns (name, function) pairs of values derived from genes."""
+        return []
+
     @classmethod
     def gh(cls):
         """Returns GenomeHandler."""
         if not hasattr(cls, "gh_cache"):
-            cls.gh_cache = GenomeHandler(cls.genes_description())
+            cls.gh_cache = GenomeHandler(
+                cls.genes_description(),
+                traits=cls.traits()
+            )
 
         return cls.gh_cache
 
-    def __init__(self, genes=[], statics=[]):
-        self.genes = genes if genes else self.gh().generate(statics=statics)
+    def __init__(self, genes=None, statics=dict(), rg=None):
+        if genes is None:
+            genes = self.gh().generate(statics=statics, rg=rg or random)
+
+        self.genes = genes
         self.data = self.gh().decode(self.genes)
-        self.idle_turns = 0
         self.age = 0
-        self.queue = []
+        # turn in which creature became dormant, see Board.sleep
+        self.slept = None
         self.init()
 
     def move(self, destination):
@@ -53,66 +78,117 @@ class Creature(object):
 
         return result
 
+    @property
+    def neighbourhood(self):
+        """Returns neighbourhood masks of creature, see Board.neighbourhood."""
+        return self.board.neighbourhood(self.position)
+
+    def destinations(self, mask):
+        """Returns destinations around creature selected by mask."""
+        x, y = self.position
+        return [(x + dx, y + dy) for dx, dy in MASKED_MOVES[mask]]
+
     @property
     def possible_destinations(self):
         """Returns all valid destinations around creature."""
-        return filter(
-            lambda x: self.board.is_correct_position(x),
-            self.any_destinations
-        )
+        free, nonfree = self.neighbourhood[:2]
+        return self.destinations(free | nonfree)
 
     @property
     def possible_free_destinations(self):
         """Returns all free destinations around creature."""
-        return filter(
-            lambda x: self.board.is_free(x),
-            self.possible_destinations
-        )
+        return self.destinations(self.neighbourhood[0])
 
     @property
     def possible_nonfree_destinations(self):
         """Returns all non-free destinations around creature."""
-        return filter(
-            lambda x: not self.board.is_free(x),
-            self.possible_destinations
-        )
+        return self.destinations(self.neighbourhood[1])
+
+    @property
+    def code(self):
+        """Returns code of creature used by neighbourhood masks."""
+        raise NotImplementedError()
 
     @property
     def alive(self):
         """Returns information whether creature is alive."""
         raise NotImplementedError()
 
+    @property
+    def starving(self):
+        """Returns information whether creature ran out of energy."""
+        raise NotImplementedError()
+
+    @property
+    def restful(self):
+        """Returns information whether turns of creature can change nothing
+        but its own health and age until its neighbourhood changes."""
+        return False
+
+    @property
+    def turns_left(self):
+        """Returns number of turns creature survives unless killed."""
+        raise NotImplementedError()
+
     def tick(self):
         """Performs one turn and related operations."""
         if not self.alive:
             self.die()
             return
 
-        self.turn()
+        starving = self.starving
+        acted = self.turn()
+        self.board.stats.starve(starving, self.starving)
         self.age += 1
 
-    def schedule(self, action, turns):
-        plan = (action, self.age + turns)
-        assert(plan not in self.queue)
-        self.queue.append(plan)
+        # code of field has to stop showing creature as alive right away
+        if not self.alive:
+            self.die()
+            return
+
+        if self.board.dormancy and not acted and self.restful:
+            self.board.sleep(self)
+
+    def idle(self, turns):
+        """Applies turns in which creature did nothing, see Board.wake."""
+        raise NotImplementedError()
 
-    def todo(self):
-        actions = filter(
-            lambda x: x[1] == self.age,
-            self.queue
-        )
+    def wake(self):
+        """Ends dormancy, planned for turn in which creature dies of age."""
+        self.board.wake(self)
 
-        for action in actions:
-            self.queue.remove(action)
+    def schedule(self, action, turns):
+        """Plans method named action to be called after given turns."""
+        # current turn is already being dispatched
+        turn = self.board.turns + max(turns, 1)
+        self.board.scheduler.schedule(turn, self.handle, action)
 
-        return actions
+    def perform(self, action):
+        """Performs scheduled action."""
+        getattr(self, action)()
 
     def turn(self):
-        """Performs one turn."""
+        """Performs one turn, returns whether creature acted."""
         raise NotImplementedError()
 
 
 class Worm(Creature):
+    # constants derived from genes live in record shared by equal genomes,
+    # see traits, so only state changing during life is kept here
+    __slots__ = (
+        "health", "energy", "fear", "direction", "died", "genetic_material",
+    )
+
+    # attributes saved in checkpoints, besides genes and position
+    STATE = [
+        ("health", "float64"),
+        ("energy", "float64"),
+        ("fear", "float64"),
+        ("age", "int64"),
+        ("direction", "int8"),
+        ("died", "bool"),
+    ]
+
     @property
     def color(self):
         return self.species if self.alive else (50, 50, 50)
@@ -174,11 +250,26 @@ class Worm(Creature):
             )
         ]
 
+    @classmethod
+    def traits(cls):
+        # age is whole number of turns, so thresholds are rounded inwards
+        return [
+            ("lifespan", lambda x: int(x["max_age"] * 1000.0)),
+            ("young_until", lambda x: int(math.floor(x["lifespan"] * 0.13))),
+            ("procreation_from", lambda x: int(math.ceil(x["lifespan"] * 0.18))),
+            ("procreation_until", lambda x: int(math.floor(x["lifespan"] * 0.45))),
+            ("turn_energy_impact", lambda x: 0.005 * x["max_energy"]),
+            ("starvation_impact", lambda x: 0.025 * x["max_health"]),
+            ("dead_code", lambda x: h.encode_field(
+                False,
+                cls.gh().index("gender", x["gender"]),
+                cls.gh().index("species", x["species"])
+            )),
+        ]
+
     def init(self):
-        self.health = self.max_health
-        self.energy = self.max_energy
-        self.turn_energy_impact = 0.005 * self.max_energy
-        self.starvation_impact = 0.025 * self.max_health
+        self.health = self.data.max_health
+        self.energy = self.data.max_energy
         self.genetic_material = None
         self.direction = 0
 
@@ -186,107 +277,143 @@ class Worm(Creature):
         self.fear = 0.0
         self.died = False
 
-        self.last = ''
+    @property
+    def code(self):
+        # alive bit, see helpers.encode_field
+        return self.data.dead_code | 2 if self.alive else self.data.dead_code
 
     @property
     def gender(self):
-        return self.data["gender"]
+        return self.data.gender
 
     @property
     def species(self):
-        return self.data["species"]
+        return self.data.species
 
     @property
     def max_health(self):
-        return self.data["max_health"]
+        return self.data.max_health
 
     @property
     def max_energy(self):
-        return self.data["max_energy"]
+        return self.data.max_energy
+
+    @property
+    def max_age(self):
+        return self.data.lifespan
+
+    @property
+    def turn_energy_impact(self):
+        return self.data.turn_energy_impact
+
+    @property
+    def starvation_impact(self):
+        return self.data.starvation_impact
 
     @property
     def strength(self):
-        return self.data["strength"]
+        return self.data.strength
 
     @property
     def temperament(self):
-        return self.data["temperament"]
+        return self.data.temperament
 
     @property
     def aggression(self):
-        return self.data["aggression"]
-
-    @property
-    def max_age(self):
-        return int(self.data["max_age"] * 1000.0)
+        return self.data.aggression
 
     @property
     def mobility(self):
-        return self.data["mobility"]
+        return self.data.mobility
 
     @property
     def eats_own_carrion(self):
-        return self.data["eats_own_carrion"]
+        return self.data.eats_own_carrion
 
     @property
     def alive(self):
-        return self.health > 0.0 and self.age < self.max_age
+        return self.health > 0.0 and self.age < self.data.lifespan
+
+    @property
+    def starving(self):
+        return self.energy == 0.0
 
     @property
     def young(self):
-        return self.age <= self.max_age * 0.13
+        return self.age <= self.data.young_until
+
+    @property
+    def restful(self):
+        free, nonfree, alive, same, opposite = self.neighbourhood
+
+        # starving loses health until it dies, partners and victims are
+        # chosen randomly
+        if not self.alive or self.energy == 0.0 or alive & (~same | opposite):
+            return False
+
+        food = nonfree & ~alive
+        if not self.eats_own_carrion:
+            food &= ~same
+        if food and (self.energy < 0.4 * self.data.max_energy or not free):
+            return False
+
+        return not free or self.mobility == 0.0
+
+    @property
+    def turns_left(self):
+        return max(self.data.lifespan - self.age, 0)
 
     @property
     def procreation_able(self):
-        return (self.age >= (self.max_age * 0.18)) and (self.age <= (self.max_age * 0.45)) #and self.fear == 0.0
+        return self.data.procreation_from <= self.age <= self.data.procreation_until #and self.fear == 0.0
 
     @property
     def possible_food(self):
-        food = [x for x in self.possible_nonfree_destinations if not self.board.at(x).alive]
+        free, nonfree, alive, same, opposite = self.neighbourhood
+        food = nonfree & ~alive
 
         if not self.eats_own_carrion:
-            food = [x for x in food if self.board.at(x).species != self.species]
+            food &= ~same
 
-        return food
+        return self.destinations(food)
 
     @property
     def possible_partners(self):
-        return [x for x in self.possible_nonfree_destinations if self.board.at(x).alive and self.board.at(x).species == self.species and self.board.at(x).want_partner and self.board.at(x).gender != self.gender]
+        free, nonfree, alive, same, opposite = self.neighbourhood
+        return [x for x in self.destinations(nonfree & alive & same & opposite) if self.board.at(x).want_partner]
 
     @property
     def possible_victims(self):
-        victims = [x for x in self.possible_nonfree_destinations if self.board.at(x).alive]
-        victims = filter(lambda x: self.board.at(x).species != self.species, victims)
-
-        return victims
+        free, nonfree, alive, same, opposite = self.neighbourhood
+        return self.destinations(nonfree & alive & ~same)
 
     @property
     def want_food(self):
-        return self.energy < (0.4 * self.max_energy) or len(self.possible_free_destinations) == 0
+        return self.energy < (0.4 * self.data.max_energy) or len(self.possible_free_destinations) == 0
 
     @property
     def want_procreation(self):
         #targets = self.possible_free_destinations
-        #return self.procreation_able and len(targets) >= 2 and h.probability(self.temperament) and not self.want_food
-        return self.gender == 'male' and self.procreation_able and h.probability(self.temperament)
+        #return self.procreation_able and len(targets) >= 2 and h.probability(self.temperament, self.board.rg) and not self.want_food
+        return self.gender == 'male' and self.procreation_able and h.probability(self.temperament, self.board.rg)
 
     @property
     def want_partner(self):
-        return self.procreation_able and h.probability(self.temperament) and not self.is_pregnant
+        return self.procreation_able and h.probability(self.temperament, self.board.rg) and not self.is_pregnant
 
     @property
     def want_move(self):
-        return h.probability(self.mobility) and self.energy > 0.0
+        return h.probability(self.mobility, self.board.rg) and self.energy > 0.0
 
     @property
     def want_attack(self):
         if self.young:
             return False
 
-        if h.probability(self.aggression):
+        if h.probability(self.aggression, self.board.rg):
             return True
 
-        if h.probability(self.fear):
+        if h.probability(self.fear, self.board.rg):
             return True
 
         if self.want_food:
@@ -297,8 +424,8 @@ class Worm(Creature):
     def attack(self, pos):
         neighbor = self.board.at(pos)
 
-        offensive = self.strength * (self.health / self.max_health)
-        defensive = neighbor.strength * (neighbor.health / neighbor.max_health)
+        offensive = self.strength * (self.health / self.data.max_health)
+        defensive = neighbor.strength * (neighbor.health / neighbor.data.max_health)
 
         if offensive > defensive or neighbor.young:
             impact = offensive
@@ -306,10 +433,16 @@ class Worm(Creature):
                 impact -= defensive
 
             impact = max(0.0, impact)
-            neighbor.health = max(0.0, neighbor.health - (neighbor.max_health * impact))
+            neighbor.health = max(0.0, neighbor.health - (neighbor.data.max_health * impact))
             neighbor.fear = min(neighbor.fear + 0.3, 1.0)
+
+            if not neighbor.alive:
+                neighbor.die()
+                self.board.stats.event("kills")
         else:
-            neighbor.energy = max(neighbor.energy - (3 * neighbor.turn_energy_impact), 0.0)
+            starving = neighbor.starving
+            neighbor.energy = max(neighbor.energy - (3 * neighbor.data.turn_energy_impact), 0.0)
+            self.board.stats.starve(starving, neighbor.starving)
 #            print(neighbor.energy)
 
     def procreate(self, pos):
@@ -330,16 +463,17 @@ class Worm(Creature):
 #            self.board.put(c, targets[i])
 
     def eat(self, pos):
-        neighbor = self.board.at(pos)
-        self.energy = min(self.max_energy, self.energy + neighbor.energy + 0.5)
-        self.board.remove(pos)
+        energy = self.board.consume(pos)
+        self.energy = min(self.data.max_energy, self.energy + energy + 0.5)
+        self.board.stats.event("meals")
         # self.move(neighbor.position)  # ???
 
     def die(self):
         if not self.died:
 #            print("TRUP")
             self.died = True
-            self.board.check_in(self)
+            # carrion stays on board only as record in its carrion layer
+            self.board.bury(self)
 #            print("TRUP")
 #            self.board.ops_queue.put((self.position, (80, 80, 80)))
 
@@ -347,71 +481,117 @@ class Worm(Creature):
         assert(self.gender == 'female')
         assert(self.genetic_material is None)
         self.genetic_material = material
-        self.schedule('born', int(self.max_age * 0.05))
+        self.schedule('born', int(self.data.lifespan * 0.05))
 
     @property
     def is_pregnant(self):
         return self.genetic_material is not None
 
+    def born(self):
+        # dead mother never gives birth
+        targets = self.possible_free_destinations if self.alive else []
+        if len(targets) >= 2:
+            self.board.rg.shuffle(targets)
+
+            n = self.gh().count
+            for i, x in enumerate(h.crossover(self.genes, self.genetic_material, n, self.board.rg)):
+                x = h.mutate_bin(x, n, rg=self.board.rg)
+                c = Worm(genes=x)
+                self.board.put(c, targets[i])
+                self.board.stats.event("births")
+#        else:
+#            print("PORONIENIE")
+
+        self.genetic_material = None
+
     def turn(self):
-        self.fear = max(self.fear - 0.1, 0.0)
+        self.regenerate()
+
+        # first phase which acts ends turn
+        if self.try_eat():
+            return True
 
-        actions = self.todo()
-        if actions:
-            targets = self.possible_free_destinations
-            if len(targets) >= 2:
-                random.shuffle(targets)
+        if self.try_procreate():
+            return True
+
+        if self.try_attack():
+            return True
 
-                for i, x in enumerate(h.crossover(self.genes, self.genetic_material)):
-                    x = h.mutate_bin(x)
-                    c = Worm(genes=x)
-                    self.board.put(c, targets[i])
+        return self.try_move()
 
-                self.genetic_material = None
-            else:
-                self.genetic_material = None
-#                print("PORONIENIE")
+    def idle(self, turns):
+        while turns > 0:
+            if not self.alive:
+                self.die()
+                return
+
+            fear, health = self.fear, self.health
+            self.regenerate()
+            self.age += 1
+            turns -= 1
+
+            if self.fear == fear and self.health == health:
+                # only age changes until creature dies of it
+                skip = min(turns, self.turns_left)
+                self.age += skip
+                turns -= skip
+
+        if not self.alive:
+            self.die()
+
+    def regenerate(self):
+        self.fear = max(self.fear - 0.1, 0.0)
 
         # regeneration
         if self.energy > 0:
-            self.health = min(self.max_health, self.health * 1.05)
+            self.health = min(self.data.max_health, self.health * 1.05)
 
         # being hungry kills ;-)
         if self.energy == 0:
-            self.health = max(self.health - self.starvation_impact, 0.0)
+            self.health = max(self.health - self.data.starvation_impact, 0.0)
 
+    def try_eat(self):
         food = self.possible_food
         if food and (self.want_food or len(self.possible_free_destinations) == 0):
 #            print("EAT")
-            self.eat(random.choice(food))
-            self.energy = max(self.energy - self.turn_energy_impact, 0.0)
-            self.last = 'eat'
-            return
+            self.eat(self.board.rg.choice(food))
+            self.energy = max(self.energy - self.data.turn_energy_impact, 0.0)
+            return True
 
+        return False
+
+    def try_procreate(self):
         partners = self.possible_partners
         #print(partners)
         if partners and self.want_procreation and not self.want_food:
-            p = random.choice(partners)
+            p = self.board.rg.choice(partners)
             self.procreate(p)
-            self.energy = max(self.energy - (self.turn_energy_impact * 5), 0.0)
-            self.last = 'procreate'
-            return
+            self.energy = max(self.energy - (self.data.turn_energy_impact * 5), 0.0)
+            return True
+
+        return False
 
+    def try_attack(self):
         victims = self.possible_victims
         if victims and self.want_attack:
 #            print("ATTACK")
-            self.attack(random.choice(victims))
-            self.energy = max(self.energy - self.turn_energy_impact, 0.0)
-            self.last = 'attack'
-            return
+            self.attack(self.board.rg.choice(victims))
+            self.energy = max(self.energy - self.data.turn_energy_impact, 0.0)
+            return True
 
+        return False
+
+    def try_move(self):
         targets = self.possible_free_destinations
         if targets and self.want_move:
 #            print("MOVE")
-            while not self.board.is_free(self.any_destinations[self.direction]):
-                self.direction = random.randint(0, len(self.any_destinations)-1)
+            destinations = self.any_destinations
+            while not self.board.is_free(destinations[self.direction]):
+                self.direction = self.board.rg.randint(0, len(destinations)-1)
 
-            self.move(self.any_destinations[self.direction])
+            self.move(destinations[self.direction])
 #            self.move(random.choice(targets))
-            self.energy = max(self.energy - self.turn_energy_impact, 0.0)
-            return
+            self.energy = max(self.energy - self.data.turn_energy_impact, 0.0)
+            return True
+
+        return False
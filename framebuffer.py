@@ -0,0 +1,63 @@
+import numpy as np
+from multiprocessing import shared_memory
+
+# bytes before pixels, holding number of published turn
+HEADER = 8
+
+
+class Framebuffer(object):
+    """RGB pixels of board kept in shared memory.
+
+    Logic process paints fields straight into pixels and bumps turn counter
+    after every turn, render process blits pixels whenever counter changed.
+    Pixels are indexed [x, y], the same way as pygame.surfarray.
+    """
+
+    def __init__(self, width, height, name=None):
+        self.width = width
+        self.height = height
+        self.owner = name is None
+
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(
+                create=True,
+                size=HEADER + width * height * 3
+            )
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+
+        self.counter = np.ndarray((1,), dtype=np.uint64, buffer=self.shm.buf)
+        self.pixels = np.ndarray(
+            (width, height, 3),
+            dtype=np.uint8,
+            buffer=self.shm.buf,
+            offset=HEADER
+        )
+
+        if self.owner:
+            self.counter[0] = 0
+            self.pixels[:] = 0
+
+    def __getstate__(self):
+        return dict(width=self.width, height=self.height, name=self.shm.name)
+
+    def __setstate__(self, state):
+        self.__init__(state["width"], state["height"], name=state["name"])
+
+    @property
+    def turn(self):
+        """Returns number of last published turn."""
+        return int(self.counter[0])
+
+    def publish(self):
+        """Marks pixels of next turn as complete."""
+        self.counter[0] += 1
+
+    def close(self):
+        """Detaches from shared memory, removing it when created here."""
+        del self.counter
+        del self.pixels
+        self.shm.close()
+
+        if self.owner:
+            self.shm.unlink()
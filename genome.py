@@ -1,39 +1,119 @@
 import helpers as h
 import collections
+import numpy as np
+import random
 
 
 class GenomeHandler(object):
-    def __init__(self, genes_description):
+    """Encodes genes as bits of single integer.
+
+    First bit of description is the most significant one, so packed genome
+    reads the same as list of bits joined together.
+
+    Decoded genes are immutable records kept in LRU cache keyed by genome,
+    so creatures with equal genomes share single record. Traits are
+    (name, function) pairs computing further fields of record from genes
+    and earlier traits, so they are also computed once per genome.
+    """
+
+    CACHE_SIZE = 65536
+
+    def __init__(self, genes_description, traits=(), cache_size=None):
         self.genes_description = genes_description
-        self.count = 0
+        self.traits = list(traits)
+        self.count = sum(item["count"] for item in self.genes_description)
+        self.record = collections.namedtuple(
+            "Genes",
+            [item["name"] for item in self.genes_description] +
+            [name for name, _ in self.traits]
+        )
+
+        self.cache = collections.OrderedDict()
+        self.cache_size = cache_size or self.CACHE_SIZE
+        self.hits = 0
+        self.misses = 0
 
         index = 0
         self.genes_map = collections.OrderedDict()
         for item in self.genes_description:
-            self.genes_map[item["name"]] = slice(index, index + item["count"])
+            shift = self.count - index - item["count"]
+            mask = (1 << item["count"]) - 1
+            self.genes_map[item["name"]] = (shift, mask)
             index += item["count"]
-            self.count += item["count"]
 
-    def generate(self, statics=dict()):
-        genes = h.generate_bin(self.count)
+    def generate(self, statics=dict(), rg=random):
+        genome = h.generate_packed(self.count, rg)
 
         for name, value in statics.items():
-            genes[self.genes_map[name]] = value
+            shift, mask = self.genes_map[name]
+            genome &= ~(mask << shift)
+            genome |= h.pack_bin(value) << shift
 
-        return genes
+        return genome
+
+    def index(self, name, value):
+        """Returns index of value among choices of gene."""
+        for item in self.genes_description:
+            if item["name"] == name:
+                return item["choices"].index(value)
 
     def decode(self, genome):
-        assert(len(genome) == self.count)
+        """Returns record of genes, shared by all equal genomes."""
+        record = self.cache.pop(genome, None)
+        if record is None:
+            self.misses += 1
+            record = self.decode_record(genome)
+            if len(self.cache) >= self.cache_size:
+                self.cache.popitem(last=False)
+        else:
+            self.hits += 1
+
+        # most recently used at the end
+        self.cache[genome] = record
+        return record
+
+    def decode_record(self, genome):
+        assert(genome >> self.count == 0)
+
+        values = dict()
+        for item in self.genes_description:
+            shift, mask = self.genes_map[item["name"]]
+            value = (genome >> shift) & mask
+
+            if "choices" in item:
+                value = item["choices"][value]
+            else:
+                value = value / float(mask)
+
+            values[item["name"]] = value
+
+        for name, function in self.traits:
+            values[name] = function(values)
+
+        return self.record(**values)
+
+    def cache_info(self):
+        """Returns hits, misses and size of decoding cache."""
+        return dict(hits=self.hits, misses=self.misses, size=len(self.cache))
+
+    def decode_batch(self, genomes):
+        """Decodes many genomes at once.
+
+        Returns dict of arrays, with indices of choices for genes having
+        them and values scaled to [0, 1] for the rest.
+        """
+        assert(self.count <= 64)
+        genomes = np.asarray(genomes, dtype=np.uint64)
 
         data = dict()
         for item in self.genes_description:
-            value = h.decode_bin(
-                genome[self.genes_map[item["name"]]],
-                base=None if "choices" in item else 1.0
-            )
+            shift, mask = self.genes_map[item["name"]]
+            value = (genomes >> np.uint64(shift)) & np.uint64(mask)
 
             if "choices" in item:
-                value = item["choices"][int(value)]
+                value = value.astype(np.int64)
+            else:
+                value = value / float(mask)
 
             data[item["name"]] = value
 
@@ -0,0 +1,49 @@
+import sys
+import json
+import time
+import argparse
+from simulation import Simulation, load_config
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Runs simulation without UI for fixed number of turns."
+    )
+    parser.add_argument("config", help="path to YAML config")
+    parser.add_argument("--turns", type=int, default=1000,
+                        help="number of last turn, also when resuming")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--resume", default=None,
+                        help="checkpoint to continue from")
+    parser.add_argument("--checkpoint", default=None,
+                        help="path of checkpoint, overrides config")
+    parser.add_argument("--checkpoint-every", type=int, default=None,
+                        help="turns between checkpoints, overrides config")
+    parser.add_argument("--record", default=None,
+                        help="directory for history of run, overrides config")
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    args = parse_args(argv)
+    options = load_config(args.config)
+
+    checkpoint = options.setdefault("checkpoint", dict())
+    if args.checkpoint:
+        checkpoint["path"] = args.checkpoint
+    if args.checkpoint_every is not None:
+        checkpoint["every"] = args.checkpoint_every
+    if args.record:
+        options.setdefault("recording", dict())["path"] = args.record
+
+    simulation = Simulation(options=options, seed=args.seed, resume=args.resume)
+
+    started = time.time()
+    summary = simulation.run(args.turns)
+    summary["seconds"] = round(time.time() - started, 3)
+
+    print(json.dumps(summary, sort_keys=True))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,50 +1,43 @@
 import random
 
 
-def probability(p):
-    return random.random() <= p
+def probability(p, rg=random):
+    return rg.random() <= p
 
 
-def generate_bin(n):
-    return [random.randint(0, 1) for x in range(n)]
-#    print([random.randint(0, 1)] + [1, 1, 1] + [7 * [1, 1, 1, 1, 1, 1]])
-#    exit(0)
-#    return [random.randint(0, 1) for x in range(n-1)] + [0]
-    r = random.randint(0, 2)
+def generate_packed(n, rg=random):
+    return rg.getrandbits(n)
 
-    if r == 0:
-        return [random.randint(0, 1)] + [1, 1, 1] + (7 * [1, 0, 0, 0, 0, 0])
-    elif r == 1:
-        return [random.randint(0, 1)] + [1, 0, 0] + (7 * [1, 0, 0, 0, 0, 0])
-    else:
-        return [random.randint(0, 1)] + [0, 0, 1] + (7 * [0, 1, 0, 0, 0, 0])
 
+def pack_bin(x):
+    """Packs list of bits into integer, first bit being the most significant."""
+    v = 0
+    for bit in x:
+        v = (v << 1) | bit
 
-def crossover(a, b):
-    assert(len(a) == len(b))
-    x = random.choice(range(len(a)))
-    return a[:x] + b[x:], b[:x] + a[x:]
+    return v
 
 
-def mutate_bin(a, p=0.01):
-    if False and probability(p):
-        a = list(a)
-        x = random.choice(range(len(a)))
-        a[x] = 0 if a[x] else 1
+def crossover(a, b, n, rg=random):
+    """Crosses over two packed genomes of n bits."""
+    x = rg.choice(range(n))
+    tail = (1 << (n - x)) - 1
+    return (a & ~tail) | (b & tail), (b & ~tail) | (a & tail)
 
-    return a
 
+def mutate_bin(a, n, p=0.01, rg=random):
+    """Flips random bit of packed genome of n bits."""
+    if False and probability(p, rg):
+        a ^= 1 << rg.choice(range(n))
+
+    return a
 
-def decode_bin(x, base=1.0):
-    xs = "".join(map(str, x))
-    v = float(int(xs, 2))
 
-    if base is None:
-        return v
-    else:
-        max = float(pow(2, len(x))-1)
-        return (v/max)*base
+def encode_field(alive, gender, species):
+    """Packs properties of creature into code used by neighbourhood masks."""
+    return 1 | (2 if alive else 0) | (gender << 2) | (species << 3)
 
 
-def decode_dict(genes, choices):
-    return choices[int(decode_bin(genes, base=None))]
+def decode_field(code):
+    """Returns (alive, gender, species) packed by encode_field."""
+    return bool(code & 2), (code >> 2) & 1, code >> 3
@@ -0,0 +1,143 @@
+import cProfile
+import collections
+import timeit
+from creatures import Worm
+from genome import GenomeHandler
+
+timer = timeit.default_timer
+
+# name of measure: (class, method), board methods are added per backend
+METHODS = collections.OrderedDict([
+    ("turn.regenerate", (Worm, "regenerate")),
+    ("turn.eat", (Worm, "try_eat")),
+    ("turn.procreate", (Worm, "try_procreate")),
+    ("turn.attack", (Worm, "try_attack")),
+    ("turn.move", (Worm, "try_move")),
+    ("turn.births", (Worm, "born")),
+    ("genome.decode", (GenomeHandler, "decode")),
+])
+BOARD_METHODS = [
+    "put", "remove", "bury", "consume", "check_in", "check_out", "neighbourhood",
+    "scan", "born", "wake",
+]
+
+
+def timed(func, counter):
+    """Returns func counting its calls and seconds in counter."""
+    def wrapper(*args, **kwargs):
+        started = timer()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            counter[0] += 1
+            counter[1] += timer() - started
+
+    return wrapper
+
+
+class Instrumentation(object):
+    """Measures calls and time of hot methods, optionally with cProfile.
+
+    Methods are replaced by timed wrappers only when instrumentation is
+    installed and restored by close, so disabled instrumentation costs
+    nothing. Times are inclusive, e.g. turn.births contains Board.put of
+    children. Workers of parallel engine are not measured.
+    """
+
+    def __init__(self, sink, every=100, profile_every=0, profile_path="profile"):
+        self.sink = sink
+        self.every = every
+        self.profile_every = profile_every
+        self.profile_path = profile_path
+        self.counters = collections.OrderedDict()
+        self.patched = []
+        self.profile = None
+        self.last_turn = None
+        self.last_time = None
+
+    def patch(self, name, owner, method):
+        """Replaces method of owner (class or object) by timed wrapper."""
+        counter = self.counters.setdefault(name, [0, 0.0])
+        own = method in vars(owner)
+        self.patched.append((owner, method, vars(owner).get(method), own))
+        setattr(owner, method, timed(getattr(owner, method), counter))
+
+    def install(self, board):
+        """Wraps methods used by board and its creatures."""
+        for name, (cls, method) in METHODS.items():
+            self.patch(name, cls, method)
+
+        cls = type(board)
+        for method in BOARD_METHODS:
+            if hasattr(cls, method):
+                self.patch("board." + method, cls, method)
+
+        if board.ui_queue is not None:
+            # blocks when renderer does not keep up
+            self.patch("ui_queue.put", board.ui_queue, "put")
+
+        self.counters["turn"] = [0, 0.0]
+
+    def uninstall(self):
+        for owner, method, original, own in reversed(self.patched):
+            if own:
+                setattr(owner, method, original)
+            else:
+                delattr(owner, method)
+
+        self.patched = []
+
+    def start(self, turn):
+        """Starts measuring from given turn."""
+        self.last_turn = turn
+        self.last_time = timer()
+        if self.profile_every:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+    def tick(self, turn):
+        """Counts finished turn and writes reports when they are due."""
+        now = timer()
+        counter = self.counters["turn"]
+        counter[0] += 1
+        counter[1] += now - self.last_time
+        self.last_time = now
+
+        if self.every and turn % self.every == 0:
+            self.report(turn)
+
+        if self.profile_every and turn % self.profile_every == 0:
+            self.profile.disable()
+            self.profile.dump_stats(
+                "{}-{}.prof".format(self.profile_path, turn)
+            )
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+    def report(self, turn):
+        """Writes calls and seconds counted since last report."""
+        turns = turn - self.last_turn
+        if not turns:
+            return
+
+        phases = dict()
+        for name, (calls, seconds) in self.counters.items():
+            phases[name] = dict(
+                calls=calls,
+                calls_per_turn=calls / float(turns),
+                seconds=seconds,
+                microseconds_per_call=1e6 * seconds / calls if calls else None
+            )
+            self.counters[name][:] = [0, 0.0]
+
+        self.sink.write(dict(turn=turn, turns=turns, phases=phases))
+        self.last_turn = turn
+
+    def close(self, turn):
+        if self.profile is not None:
+            self.profile.disable()
+            self.profile = None
+
+        self.report(turn)
+        self.uninstall()
+        self.sink.close()
@@ -0,0 +1,392 @@
+import numpy as np
+from board import unpack_masks
+from creatures import MOVES
+from stats import Statistics
+from world import ArrayWorld
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+STEPS = np.array(MOVES, dtype=np.int64)
+BIRTHS, DEATHS, KILLS, MEALS = [
+    Statistics.EVENTS.index(x) for x in ["births", "deaths", "kills", "meals"]
+]
+
+# columns passed to turn_kernel, in order of its arguments
+COLUMNS = [
+    "used", "ticked", "died", "health", "energy", "fear", "age", "born_at",
+    "genome", "material", "x", "y", "direction", "max_health", "max_energy",
+    "max_age", "strength", "temperament", "aggression", "mobility",
+    "eats_own_carrion", "gender", "species",
+]
+
+
+def jit(func):
+    """Compiles func with Numba, leaves it as plain Python without it."""
+    if numba is None:
+        return func
+
+    return numba.njit(cache=True)(func)
+
+
+# uniforms reserved for turn of single creature: one for every neighbour
+# which may be partner, temperament, then aggression and fear of attack
+# and finally mobility and direction of move
+DRAWS = len(MOVES) + 5
+
+
+@jit
+def uniform(uniforms, cursor):
+    """Returns next of uniforms, cursor is one element array of index."""
+    # budget of DRAWS per creature is never used up, wrapping only guards
+    u = uniforms[cursor[0] % uniforms.shape[0]]
+    cursor[0] += 1
+    return u
+
+
+@jit
+def choice(uniforms, cursor, count):
+    return min(int(uniform(uniforms, cursor) * count), count - 1)
+
+
+@jit
+def probability(uniforms, cursor, p):
+    return uniform(uniforms, cursor) <= p
+
+
+@jit
+def bits(mask):
+    count = 0
+    while mask:
+        count += mask & 1
+        mask >>= 1
+    return count
+
+
+@jit
+def nth(mask, n):
+    """Returns index of n-th set bit of mask."""
+    for k in range(STEPS.shape[0]):
+        if mask & (1 << k):
+            if n == 0:
+                return k
+            n -= 1
+    return -1
+
+
+@jit
+def neighbours(codes, x, y):
+    """Returns neighbourhood masks of field, see Board.scan_field."""
+    width, height = codes.shape
+    own = codes[x, y]
+    free = nonfree = alive = same = opposite = 0
+
+    for k in range(STEPS.shape[0]):
+        nx, ny = x + STEPS[k, 0], y + STEPS[k, 1]
+        if nx < 0 or ny < 0 or nx >= width or ny >= height:
+            continue
+
+        other = codes[nx, ny]
+        bit = 1 << k
+        if other == 0:
+            free |= bit
+            continue
+
+        nonfree |= bit
+        if other & 2:
+            alive |= bit
+        if (other >> 3) == (own >> 3):
+            same |= bit
+        if ((other >> 2) & 1) != ((own >> 2) & 1):
+            opposite |= bit
+
+    return free, nonfree, alive, same, opposite
+
+
+@jit
+def mark(codes, changed, counts, events, x, y, code):
+    """Stores code of field, counting it like Statistics.replace."""
+    old = codes[x, y]
+    if old:
+        counts[old] -= 1
+    if code:
+        counts[code] += 1
+    if old & 2 and code and not code & 2:
+        events[DEATHS] += 1
+
+    codes[x, y] = code
+    changed[x, y] = True
+
+
+@jit
+def drain(energy, max_energy, i, times):
+    """Drains energy and returns change of number of starving creatures."""
+    starving = energy[i] == 0.0
+    energy[i] = max(energy[i] - 0.005 * max_energy[i] * times, 0.0)
+    return int(energy[i] == 0.0) - int(starving)
+
+
+@jit
+def turn_kernel(ids, uniforms, cursor, turn, male, release, used, ticked,
+                died, health, energy, fear, age, born_at, genome, material,
+                x, y, direction, max_health, max_energy, max_age, strength,
+                temperament, aggression, mobility, eats_own_carrion, gender,
+                species, fields, codes, changed, counts, events, removed):
+    """Performs turns of creatures with ids, in order, as ArrayWorld.turn.
+
+    Random numbers are taken from uniforms, at most DRAWS per creature.
+
+    Changes of codes go to counts and events, fields which need painting
+    are set in changed and ids of eaten creatures are written to removed.
+    Without release their ids stay used, as in ArrayWorld.remove, and
+    they are only marked as ticked. Returns number of removed ids and
+    change of number of starving ones.
+    """
+    starving = 0
+    count = 0
+
+    for i in ids:
+        if not used[i] or ticked[i] == turn:
+            continue
+        ticked[i] = turn
+
+        xi, yi = x[i], y[i]
+        if not (health[i] > 0.0 and age[i] < max_age[i]):
+            if not died[i]:
+                died[i] = True
+                mark(codes, changed, counts, events, xi, yi,
+                     1 | (gender[i] << 2) | (species[i] << 3))
+            continue
+
+        fear[i] = max(fear[i] - 0.1, 0.0)
+        if energy[i] > 0:
+            health[i] = min(max_health[i], health[i] * 1.05)
+        if energy[i] == 0:
+            health[i] = max(health[i] - 0.025 * max_health[i], 0.0)
+
+        free, nonfree, alive, same, opposite = neighbours(codes, xi, yi)
+        hungry = energy[i] < 0.4 * max_energy[i] or free == 0
+        young = age[i] <= max_age[i] * 0.13
+        acted = False
+
+        food = nonfree & ~alive
+        if not eats_own_carrion[i]:
+            food &= ~same
+        if food and hungry:
+            k = nth(food, choice(uniforms, cursor, bits(food)))
+            px, py = xi + STEPS[k, 0], yi + STEPS[k, 1]
+            j = fields[px, py]
+
+            before = energy[i] == 0.0
+            energy[i] = min(max_energy[i], energy[i] + energy[j] + 0.5)
+            starving += int(energy[i] == 0.0) - int(before)
+
+            if release:
+                used[j] = False
+            else:
+                ticked[j] = turn
+            removed[count] = j
+            count += 1
+            fields[px, py] = -1
+            starving -= int(energy[j] == 0.0)
+            mark(codes, changed, counts, events, px, py, 0)
+            events[MEALS] += 1
+
+            starving += drain(energy, max_energy, i, 1)
+            acted = True
+
+        if not acted:
+            partners = 0
+            candidates = nonfree & alive & same & opposite
+            for k in range(STEPS.shape[0]):
+                if not candidates & (1 << k):
+                    continue
+                j = fields[xi + STEPS[k, 0], yi + STEPS[k, 1]]
+                if (
+                    age[j] >= max_age[j] * 0.18 and
+                    age[j] <= max_age[j] * 0.45 and
+                    probability(uniforms, cursor, temperament[j]) and
+                    born_at[j] < 0
+                ):
+                    partners |= 1 << k
+
+            if (
+                partners and
+                gender[i] == male and
+                age[i] >= max_age[i] * 0.18 and
+                age[i] <= max_age[i] * 0.45 and
+                probability(uniforms, cursor, temperament[i]) and
+                not hungry
+            ):
+                k = nth(partners, choice(uniforms, cursor, bits(partners)))
+                j = fields[xi + STEPS[k, 0], yi + STEPS[k, 1]]
+                if (
+                    age[j] >= max_age[j] * 0.18 and
+                    age[j] <= max_age[j] * 0.45 and
+                    probability(uniforms, cursor, temperament[j]) and
+                    born_at[j] < 0
+                ):
+                    material[j] = genome[i]
+                    born_at[j] = turn + max(int(max_age[j] * 0.05), 1)
+
+                starving += drain(energy, max_energy, i, 5)
+                acted = True
+
+        if not acted:
+            victims = nonfree & alive & ~same
+            if victims and not young and (
+                probability(uniforms, cursor, aggression[i]) or
+                probability(uniforms, cursor, fear[i]) or
+                hungry
+            ):
+                k = nth(victims, choice(uniforms, cursor, bits(victims)))
+                px, py = xi + STEPS[k, 0], yi + STEPS[k, 1]
+                j = fields[px, py]
+                young_j = age[j] <= max_age[j] * 0.13
+
+                offensive = strength[i] * (health[i] / max_health[i])
+                defensive = strength[j] * (health[j] / max_health[j])
+                if offensive > defensive or young_j:
+                    impact = offensive
+                    if not young_j:
+                        impact -= defensive
+
+                    impact = max(0.0, impact)
+                    health[j] = max(0.0, health[j] - max_health[j] * impact)
+                    fear[j] = min(fear[j] + 0.3, 1.0)
+
+                    if not (health[j] > 0.0 and age[j] < max_age[j]):
+                        mark(codes, changed, counts, events, px, py,
+                             1 | (gender[j] << 2) | (species[j] << 3))
+                        events[KILLS] += 1
+                else:
+                    starving += drain(energy, max_energy, j, 3)
+
+                starving += drain(energy, max_energy, i, 1)
+                acted = True
+
+        if (
+            not acted and free and
+            probability(uniforms, cursor, mobility[i]) and
+            energy[i] > 0.0
+        ):
+            # uniform among free directions, like drawing until free one
+            if not free & (1 << direction[i]):
+                direction[i] = nth(free, choice(uniforms, cursor, bits(free)))
+
+            px = xi + STEPS[direction[i], 0]
+            py = yi + STEPS[direction[i], 1]
+            fields[xi, yi] = -1
+            mark(codes, changed, counts, events, xi, yi, 0)
+
+            x[i], y[i] = px, py
+            fields[px, py] = i
+            alive_i = health[i] > 0.0 and age[i] < max_age[i]
+            mark(codes, changed, counts, events, px, py,
+                 1 | (int(alive_i) << 1) | (gender[i] << 2) |
+                 (species[i] << 3))
+
+            starving += drain(energy, max_energy, i, 1)
+
+        age[i] += 1
+        if not (health[i] > 0.0 and age[i] < max_age[i]):
+            died[i] = True
+            mark(codes, changed, counts, events, x[i], y[i],
+                 1 | (gender[i] << 2) | (species[i] << 3))
+
+    return count, starving
+
+
+class KernelWorld(ArrayWorld):
+    """ArrayWorld running turns of all creatures in single batch kernel.
+
+    Kernel follows rules of ArrayWorld.turn, compiled by Numba when it is
+    installed and run as plain Python otherwise. Random numbers are passed
+    to kernel as uniforms drawn by generator seeded from board one every
+    turn, so runs are repeatable and global NumPy generator is left alone,
+    but differ from ArrayWorld ones; both backends agree on dynamics of
+    population, see benchmark.py --conformance. Births are rare and still
+    go through ArrayWorld.deliver.
+    """
+
+    def __init__(self, options, ui_queue=None, rg=None, framebuffer=None):
+        super(KernelWorld, self).__init__(
+            options=options,
+            ui_queue=ui_queue,
+            rg=rg,
+            framebuffer=framebuffer
+        )
+
+        self.male = self.genders.index("male")
+        self.changed = np.zeros((self.width, self.height), dtype=np.bool_)
+        self.counts = np.zeros(256, dtype=np.int64)
+        self.events = np.zeros(len(Statistics.EVENTS), dtype=np.int64)
+        self.palette = np.array(self.colors, dtype=np.int32)
+
+    def scan(self, start=0, stop=None):
+        # kernel and neighbourhood read codes directly, masks are not kept
+        pass
+
+    def neighbourhood(self, position):
+        return unpack_masks(self.scan_field(position))
+
+    def tick_ids(self, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        removed = np.empty(len(ids), dtype=np.int64)
+
+        # generator of turn is seeded from board one, like PositionStrategy.pick
+        rg = np.random.default_rng(self.rg.getrandbits(64))
+        uniforms = rg.random(DRAWS * len(ids))
+        cursor = np.zeros(1, dtype=np.int64)
+
+        count, starving = turn_kernel(
+            ids, uniforms, cursor, self.turns, self.male,
+            self.reserved is None,
+            *[getattr(self, name) for name in COLUMNS] + [
+                self.fields, self.codes, self.changed,
+                self.counts, self.events, removed
+            ]
+        )
+
+        if self.reserved is None:
+            self.released.extend(removed[:count].tolist())
+        else:
+            # freed by ParallelEngine between phases, see ArrayWorld.remove
+            self.removed.extend(removed[:count].tolist())
+
+        self.collect(starving)
+        self.repaint()
+
+    def collect(self, starving):
+        """Moves counters of kernel to statistics."""
+        for code in np.flatnonzero(self.counts).tolist():
+            self.stats.codes[code] += int(self.counts[code])
+        for n in np.flatnonzero(self.events).tolist():
+            self.stats.events[Statistics.EVENTS[n]] += int(self.events[n])
+
+        self.stats.starving += starving
+        self.counts[:] = 0
+        self.events[:] = 0
+
+    def repaint(self):
+        """Paints fields changed by kernel, with colors given by codes."""
+        xs, ys = np.nonzero(self.changed)
+        self.changed[xs, ys] = False
+        if self.framebuffer is None and self.ui_queue is None and \
+                self.recorder is None:
+            return
+
+        codes = self.codes[xs, ys].astype(np.int32)
+        colors = np.where(
+            (codes & 2)[:, None] != 0,
+            self.palette[codes >> 3],
+            np.where(codes[:, None] != 0, 50, 0)
+        )
+
+        for position, color in zip(
+            zip(xs.tolist(), ys.tolist()),
+            map(tuple, colors.tolist())
+        ):
+            self.paint(position, color)
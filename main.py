@@ -1,6 +1,17 @@
 import sys
+import argparse
 from application import Application
 
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Runs simulation with UI.")
+    parser.add_argument("config", help="path to YAML config")
+    parser.add_argument("--resume", default=None,
+                        help="checkpoint to continue from")
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
-    app = Application(sys.argv[1])
+    args = parse_args(sys.argv[1:])
+    app = Application(args.config, resume=args.resume)
     app.run()
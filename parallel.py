@@ -0,0 +1,168 @@
+import mmap
+import json
+import numpy as np
+import multiprocessing as mp
+from rng import Stream
+from stats import Statistics
+
+
+def shared_zeros(shape, dtype):
+    """Returns array of zeros in memory shared with forked processes."""
+    dtype = np.dtype(dtype)
+    count = int(np.prod(shape))
+    buf = mmap.mmap(-1, max(count * dtype.itemsize, 1))
+    return np.frombuffer(buf, dtype=dtype, count=count).reshape(shape)
+
+
+class ParallelEngine(object):
+    """Runs turns of ArrayWorld in worker processes, one strip per worker.
+
+    Board is split along x into twice as many strips as there are workers
+    and worker k owns strips 2k and 2k + 1. Turn has two phases: in first
+    one all workers tick their even strips, in second one their odd strips.
+    Creature reaches only fields next to it, so while strip is processed
+    nobody else touches it nor its border columns, which makes result of
+    turn independent of timing of workers. Conflicts on borders are settled
+    by this order: even strips act first.
+
+    State of world lives in shared memory, strips get independent random
+    streams spawned from board one and workers take ids of newborns only
+    from their own slice of ids. Children finding no free id there are
+    counted as dropped_births. Ids of removed creatures are freed only
+    between phases, as creature may be removed by other worker than the
+    one whose slice its id comes from.
+    """
+
+    # creature touches only fields next to it
+    MIN_STRIP = 2
+
+    def __init__(self, world, workers):
+        self.world = world
+        self.workers = max(1, min(workers, world.width // (2 * self.MIN_STRIP)))
+
+        count = 2 * self.workers
+        bounds = [world.width * n // count for n in range(count + 1)]
+        self.strips = list(zip(bounds[:-1], bounds[1:]))
+        self.seeds = world.rg.sequence.spawn(len(self.strips))
+        # states of generators of strips, set when resuming
+        self.rg_states = None
+
+        self.processes = []
+        self.connections = []
+
+    def start(self):
+        """Moves world to shared memory and forks worker processes."""
+        self.world.share(shared_zeros)
+
+        ctx = mp.get_context("fork")
+        for k in range(self.workers):
+            parent, child = ctx.Pipe()
+            process = ctx.Process(target=self.work, args=(k, child))
+            process.daemon = True
+            process.start()
+
+            self.processes.append(process)
+            self.connections.append(parent)
+
+    def work(self, k, connection):
+        """Main loop of worker k."""
+        world = self.world
+        world.reserved = slice(k, None, self.workers)
+        world.released = []
+        world.removed = []
+        # counts only changes made here, see tick
+        world.stats = Statistics()
+
+        generators = dict(
+            (n, Stream(self.seeds[n])) for n in (2 * k, 2 * k + 1)
+        )
+        if self.rg_states is not None:
+            for n, rg in generators.items():
+                rg.setstate(self.rg_states[n])
+
+        while True:
+            message = connection.recv()
+            if message is None:
+                break
+
+            if message == "state":
+                connection.send(
+                    [(n, rg.getstate()) for n, rg in generators.items()]
+                )
+                continue
+
+            turn, phase = message
+            n = 2 * k + phase
+
+            world.turns = turn
+            world.rg = generators[n]
+            # ids depend only on shared state, so resumed run gets the same
+            world.released = []
+            world.tick_region(*self.strips[n])
+
+            connection.send(
+                (list(world.dirty.items()), world.stats, world.removed)
+            )
+            world.dirty.clear()
+            world.stats = Statistics()
+            world.removed = []
+
+    def tick(self):
+        """Performs one turn of all creatures on board."""
+        if not self.processes:
+            self.start()
+
+        self.world.turns += 1
+        for phase in (0, 1):
+            for connection in self.connections:
+                connection.send((self.world.turns, phase))
+
+            # colors are merged in order of strips
+            removed = []
+            for connection in self.connections:
+                dirty, stats, ids = connection.recv()
+                self.world.dirty.update(dirty)
+                self.world.stats.merge(stats)
+                removed.extend(ids)
+
+            # no worker runs now, so freed ids are seen by all of them alike
+            self.world.used[removed] = False
+
+    def state(self):
+        """Returns states of generators of strips as dict of arrays."""
+        states = dict()
+        if self.processes:
+            for connection in self.connections:
+                connection.send("state")
+            for connection in self.connections:
+                states.update(connection.recv())
+        elif self.rg_states is not None:
+            states = dict(enumerate(self.rg_states))
+        else:
+            for n, seed in enumerate(self.seeds):
+                states[n] = Stream(seed).getstate()
+
+        return dict(strip_rng=np.array(
+            [json.dumps(states[n]) for n in range(len(self.strips))]
+        ))
+
+    def restore(self, state):
+        """Sets generators of strips from dict made by state."""
+        assert(not self.processes)
+        if len(state.get("strip_rng", [])) != len(self.strips):
+            raise ValueError(
+                "checkpoint was saved with different number of workers"
+            )
+
+        self.rg_states = [json.loads(x) for x in state["strip_rng"].tolist()]
+
+    def close(self):
+        """Stops worker processes."""
+        for connection in self.connections:
+            connection.send(None)
+
+        for process in self.processes:
+            process.join()
+
+        self.processes = []
+        self.connections = []
@@ -1,5 +1,6 @@
 import math
-import random
+import numpy as np
+from rng import Stream
 
 
 class PositionStrategy(object):
@@ -11,11 +12,91 @@ class PositionStrategy(object):
     def positions(self):
         raise NotImplementedError()
 
+    def box(self):
+        """Returns (x0, y0, x1, y1) of fields containing region, end
+        exclusive."""
+        return 0, 0, self.board.width, self.board.height
+
+    def cells(self):
+        """Returns mask of fields of box where strategy may put creatures."""
+        x0, y0, x1, y1 = self.box()
+        return np.ones((x1 - x0, y1 - y0), dtype=bool)
+
+    def free_cells(self):
+        """Returns mask of free fields of region within box."""
+        x0, y0, x1, y1 = self.box()
+        return self.cells() & (self.board.codes[x0:x1, y0:y1] == 0)
+
+    def candidates(self):
+        """Returns free fields of region as arrays of x and y."""
+        x0, y0, x1, y1 = self.box()
+        xs, ys = np.nonzero(self.free_cells())
+        return xs + x0, ys + y0
+
+    def pick(self, count, n):
+        """Returns indexes of n distinct candidates out of count."""
+        # NumPy draws millions of indexes at once, seed keeps it repeatable
+        rg = np.random.default_rng(self.rg.getrandbits(64))
+        return rg.choice(count, size=n, replace=False)
+
+    def sample(self, n):
+        """Returns n distinct free positions from region, in one pass."""
+        if getattr(self.board, "codes", None) is None:
+            # boards without dense codes, e.g. ChunkedBoard
+            return self.scatter(n)
+
+        xs, ys = self.candidates()
+        if n > len(xs):
+            raise ValueError(
+                "{} has {} free fields in its region, {} requested".format(
+                    type(self).__name__, len(xs), n
+                )
+            )
+
+        chosen = self.pick(len(xs), n)
+        return list(zip(xs[chosen].tolist(), ys[chosen].tolist()))
+
+    def scatter(self, n):
+        """Returns n distinct free positions taken from positions one by one.
+
+        Region is never built as a whole, so board can be huge, but search
+        gives up after 100 tries per position.
+        """
+        chosen = dict()
+        for attempt, position in enumerate(self.positions()):
+            if len(chosen) == n or attempt >= 100 * n:
+                break
+
+            if self.board.is_free(position):
+                chosen.setdefault(self.board.wrap(position), len(chosen))
+
+        if len(chosen) < n:
+            raise ValueError(
+                "{} found {} free fields in its region, {} requested".format(
+                    type(self).__name__, len(chosen), n
+                )
+            )
+
+        return sorted(chosen, key=chosen.get)
+
     def init(self):
-        pass
+        self.rg = self.board.rg
+
+        seed = self.options.get('seed', None)
+        if seed:
+            self.rg = Stream(seed)
 
 
 class HorizontalPositionStrategy(PositionStrategy):
+    def candidates(self):
+        x0, y0, x1, y1 = self.box()
+        ys, xs = np.nonzero(self.free_cells().T)
+        return xs + x0, ys + y0
+
+    def pick(self, count, n):
+        # first free fields, row by row
+        return np.arange(n)
+
     def positions(self):
         for y in range(self.board.height):
             for x in range(self.board.width):
@@ -23,6 +104,10 @@ class HorizontalPositionStrategy(PositionStrategy):
 
 
 class VerticalPositionStrategy(PositionStrategy):
+    def pick(self, count, n):
+        # first free fields, column by column
+        return np.arange(n)
+
     def positions(self):
         for x in range(self.board.width):
             for y in range(self.board.height):
@@ -30,28 +115,39 @@ class VerticalPositionStrategy(PositionStrategy):
 
 
 class RandomPositionStrategy(PositionStrategy):
-    def init(self):
-        self.rg = random.Random()
-
-        seed = self.options.get('seed', None)
-        if seed:
-            self.rg.seed(seed)
-
     def positions(self):
         while True:
             yield (
-                random.randint(0, self.board.width - 1),
-                random.randint(0, self.board.height - 1)
+                self.rg.randint(0, self.board.width - 1),
+                self.rg.randint(0, self.board.height - 1)
             )
 
 
 class CirclePositionStrategy(PositionStrategy):
+    def box(self):
+        x, y = self.options["point"]["x"], self.options["point"]["y"]
+        r = self.options["radius"]
+        x0 = max(int(math.floor(x - r)), 0)
+        y0 = max(int(math.floor(y - r)), 0)
+        # empty when circle lies outside of board
+        x1 = max(min(int(math.ceil(x + r)) + 1, self.board.width), x0)
+        y1 = max(min(int(math.ceil(y + r)) + 1, self.board.height), y0)
+        return x0, y0, x1, y1
+
+    def cells(self):
+        # only box of circle, board may be huge
+        x0, y0, x1, y1 = self.box()
+        xs, ys = np.indices((x1 - x0, y1 - y0))
+        dx = xs + x0 - self.options["point"]["x"]
+        dy = ys + y0 - self.options["point"]["y"]
+        return dx * dx + dy * dy <= self.options["radius"] ** 2
+
     def positions(self):
         # https://stackoverflow.com/questions/5837572/generate-a-random-point-within-a-circle-uniformly
 
         while True:
-            t = 2.0 * math.pi * random.random()
-            u = random.random() + random.random()
+            t = 2.0 * math.pi * self.rg.random()
+            u = self.rg.random() + self.rg.random()
             r = 2.0-u if u > 1 else u
 
             xo = r * math.cos(t) * self.options["radius"]
@@ -0,0 +1,215 @@
+import os
+import json
+import numpy as np
+
+# changed field, as in batches of Board.flush
+DELTA = np.dtype([
+    ("x", "<u2"),
+    ("y", "<u2"),
+    ("r", "u1"),
+    ("g", "u1"),
+    ("b", "u1"),
+])
+# greatest width and height coordinates of DELTA hold
+MAX_SIZE = np.iinfo(DELTA["x"]).max + 1
+
+# one row per recorded turn, keyframe is -1 when turn has none
+INDEX = np.dtype([
+    ("turn", "<i8"),
+    ("offset", "<i8"),
+    ("count", "<i8"),
+    ("keyframe", "<i8"),
+])
+
+
+def mapped(path, dtype, shape=()):
+    """Returns file as read-only memory-mapped array of records."""
+    size = os.path.getsize(path)
+    count = size // (dtype.itemsize * int(np.prod(shape)))
+    if not count:
+        return np.empty((0,) + shape, dtype=dtype)
+
+    return np.memmap(path, dtype=dtype, mode="r", shape=(count,) + shape)
+
+
+class Recorder(object):
+    """Appends colors changed in every turn to files in directory.
+
+    Directory holds meta.json with size of board, index.bin with row of
+    INDEX per turn, deltas.bin with DELTA records of all turns one after
+    another and keyframes.bin with full RGB frames. Frame is stored every
+    keyframe_every recorded turns, so any turn can be rebuilt from nearest
+    keyframe before it and at most keyframe_every turns of deltas.
+    Writes are plain buffered appends, only Recording maps files.
+
+    With resume_turn, recording found in directory is continued: turns
+    after resume_turn, recorded by run which went on past its checkpoint,
+    are cut off and following turns are appended.
+    """
+
+    def __init__(self, path, width, height, keyframe_every=100,
+                 resume_turn=None):
+        if keyframe_every < 1:
+            raise ValueError("keyframe_every has to be at least 1")
+        if max(width, height) > MAX_SIZE:
+            raise ValueError(
+                "board {}x{} is too big to record, at most {} fields "
+                "along each side".format(width, height, MAX_SIZE)
+            )
+
+        self.width = width
+        self.height = height
+        self.keyframe_every = keyframe_every
+        self.pixels = np.zeros((width, height, 3), dtype=np.uint8)
+        self.rows = 0
+        self.offset = 0
+        self.keyframes = 0
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+        meta = dict(width=width, height=height, keyframe_every=keyframe_every)
+        mode = "wb"
+        if resume_turn is not None and os.path.exists(
+            os.path.join(path, "meta.json")
+        ):
+            self.cut(path, meta, resume_turn)
+            mode = "ab"
+
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+        self.files = dict(
+            (name, open(os.path.join(path, name + ".bin"), mode))
+            for name in ["index", "deltas", "keyframes"]
+        )
+
+    def cut(self, path, meta, turn):
+        """Drops turns after turn from recording and continues from it."""
+        recording = Recording(path)
+        for name, value in meta.items():
+            if getattr(recording, name) != value:
+                raise ValueError(
+                    "recording in {} has {} {}, not {}".format(
+                        path, name, getattr(recording, name), value
+                    )
+                )
+
+        self.rows = int(np.searchsorted(
+            recording.index["turn"], turn, side="right"
+        ))
+        if self.rows:
+            last = recording.index[self.rows - 1]
+            self.offset = int(last["offset"] + last["count"])
+            self.keyframes = int(
+                recording.index["keyframe"][:self.rows].max() + 1
+            )
+            self.pixels[:] = recording.seek(int(last["turn"]))
+
+        sizes = dict(
+            index=self.rows * INDEX.itemsize,
+            deltas=self.offset * DELTA.itemsize,
+            keyframes=self.keyframes * self.pixels.nbytes,
+        )
+        # maps have to be gone before files shrink
+        del recording
+        for name, size in sizes.items():
+            with open(os.path.join(path, name + ".bin"), "r+b") as f:
+                f.truncate(size)
+
+    def record(self, turn, batch):
+        """Appends changes of turn, batch as made by Board.flush or None."""
+        count = 0 if batch is None else len(batch)
+        if count:
+            deltas = np.empty(count, dtype=DELTA)
+            for k, name in enumerate(DELTA.names):
+                deltas[name] = batch[:, k]
+            self.files["deltas"].write(deltas.tobytes())
+            self.pixels[batch[:, 0], batch[:, 1]] = batch[:, 2:]
+
+        keyframe = -1
+        if self.rows % self.keyframe_every == 0:
+            keyframe = self.keyframes
+            self.files["keyframes"].write(self.pixels.tobytes())
+            self.keyframes += 1
+
+        row = np.array([(turn, self.offset, count, keyframe)], dtype=INDEX)
+        self.files["index"].write(row.tobytes())
+
+        self.rows += 1
+        self.offset += count
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+
+
+class Recording(object):
+    """Reads directory written by Recorder, without simulating anything."""
+
+    def __init__(self, path):
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+
+        self.width = meta["width"]
+        self.height = meta["height"]
+        self.keyframe_every = meta["keyframe_every"]
+
+        self.index = mapped(os.path.join(path, "index.bin"), INDEX)
+        self.deltas = mapped(os.path.join(path, "deltas.bin"), DELTA)
+        self.keyframes = mapped(
+            os.path.join(path, "keyframes.bin"),
+            np.dtype(np.uint8),
+            (self.width, self.height, 3)
+        )
+
+        # row of nearest keyframe at or before every row
+        rows = np.where(self.index["keyframe"] >= 0, np.arange(len(self)), 0)
+        self.keyframe_rows = np.maximum.accumulate(rows) if len(self) else rows
+
+        self.pixels = np.zeros((self.width, self.height, 3), dtype=np.uint8)
+        self.row = None
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def first_turn(self):
+        return int(self.index["turn"][0])
+
+    @property
+    def last_turn(self):
+        return int(self.index["turn"][-1])
+
+    @property
+    def turn(self):
+        """Returns turn shown in pixels, None before first seek."""
+        return None if self.row is None else int(self.index["turn"][self.row])
+
+    def apply(self, row):
+        """Paints changes of row onto pixels."""
+        offset, count = self.index["offset"][row], self.index["count"][row]
+        deltas = self.deltas[offset:offset + count]
+        self.pixels[deltas["x"], deltas["y"], 0] = deltas["r"]
+        self.pixels[deltas["x"], deltas["y"], 1] = deltas["g"]
+        self.pixels[deltas["x"], deltas["y"], 2] = deltas["b"]
+
+    def seek(self, turn):
+        """Sets pixels to board after given turn, clamped to recorded ones.
+
+        Moving forward by less than keyframe interval only applies deltas
+        of skipped turns, otherwise playback starts from nearest keyframe.
+        """
+        row = int(np.searchsorted(self.index["turn"], turn, side="right")) - 1
+        row = min(max(row, 0), len(self) - 1)
+
+        keyframe_row = int(self.keyframe_rows[row])
+        if self.row is None or not keyframe_row <= self.row <= row:
+            self.pixels[:] = self.keyframes[self.index["keyframe"][keyframe_row]]
+            self.row = keyframe_row
+
+        for n in range(self.row + 1, row + 1):
+            self.apply(n)
+
+        self.row = row
+        return self.pixels
@@ -0,0 +1,58 @@
+class Registry(object):
+    """Slot map holding items with O(1) insert and removal.
+
+    Insert returns handle (slot, generation). Slots of removed items are
+    reused, but generation of slot changes, so stale handles never point
+    to new item.
+    """
+
+    def __init__(self):
+        self.items = []
+        self.generations = []
+        self.released = []
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return (x for x in self.items if x is not None)
+
+    def insert(self, item):
+        """Adds item and returns its handle."""
+        if self.released:
+            slot = self.released.pop()
+            self.items[slot] = item
+        else:
+            slot = len(self.items)
+            self.items.append(item)
+            self.generations.append(0)
+
+        self.count += 1
+        return (slot, self.generations[slot])
+
+    def remove(self, handle):
+        """Removes item pointed by handle."""
+        slot, generation = handle
+        assert(self.generations[slot] == generation)
+
+        self.items[slot] = None
+        self.generations[slot] += 1
+        self.released.append(slot)
+        self.count -= 1
+
+    def get(self, handle):
+        """Returns item pointed by handle, None when it was removed."""
+        slot, generation = handle
+        if self.generations[slot] != generation:
+            return None
+
+        return self.items[slot]
+
+    def handles(self):
+        """Returns handles of all items, in order of slots."""
+        generations = self.generations
+        return [
+            (slot, generations[slot])
+            for slot, item in enumerate(self.items) if item is not None
+        ]
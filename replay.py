@@ -0,0 +1,105 @@
+import sys
+import argparse
+import pygame
+from recorder import Recording
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Plays back history of run written by recorder."
+    )
+    parser.add_argument("path", help="directory of recording")
+    parser.add_argument("--turn", type=int, default=None,
+                        help="turn to start from, first recorded by default")
+    parser.add_argument("--speed", type=float, default=30.0,
+                        help="turns per second, negative plays backwards")
+    parser.add_argument("--fps", type=int, default=30)
+    return parser.parse_args(argv)
+
+
+class Player(object):
+    """Shows turns of recording in window.
+
+    Space pauses, left and right arrows step by one turn, up and down
+    arrows double and halve speed, page up and down jump by ten keyframes.
+    """
+
+    def __init__(self, recording, speed, fps):
+        self.recording = recording
+        self.speed = speed
+        self.fps = fps
+        self.paused = False
+        self.position = float(recording.first_turn)
+
+    def seek(self, turn):
+        self.position = float(min(
+            max(turn, self.recording.first_turn),
+            self.recording.last_turn
+        ))
+
+    def handle(self, event):
+        if event.type == pygame.QUIT:
+            return False
+
+        if event.type == pygame.KEYDOWN:
+            jump = 10 * max(self.recording.keyframe_every, 1)
+            if event.key == pygame.K_SPACE:
+                self.paused = not self.paused
+            elif event.key == pygame.K_RIGHT:
+                self.seek(self.position + 1)
+            elif event.key == pygame.K_LEFT:
+                self.seek(self.position - 1)
+            elif event.key == pygame.K_PAGEUP:
+                self.seek(self.position + jump)
+            elif event.key == pygame.K_PAGEDOWN:
+                self.seek(self.position - jump)
+            elif event.key == pygame.K_UP:
+                self.speed *= 2
+            elif event.key == pygame.K_DOWN:
+                self.speed /= 2
+            elif event.key in (pygame.K_ESCAPE, pygame.K_q):
+                return False
+
+        return True
+
+    def run(self):
+        screen = pygame.display.set_mode(
+            (self.recording.width, self.recording.height)
+        )
+        clock = pygame.time.Clock()
+
+        while True:
+            for event in pygame.event.get():
+                if not self.handle(event):
+                    return
+
+            turn = int(self.position)
+            if turn != self.recording.turn:
+                pygame.surfarray.blit_array(screen, self.recording.seek(turn))
+                pygame.display.set_caption("turn {}".format(self.recording.turn))
+                pygame.display.flip()
+
+            clock.tick(self.fps)
+            if not self.paused:
+                self.seek(self.position + self.speed / self.fps)
+
+
+def main(argv):
+    args = parse_args(argv)
+    recording = Recording(args.path)
+    if not len(recording):
+        sys.exit("recording {} is empty".format(args.path))
+
+    player = Player(recording, speed=args.speed, fps=args.fps)
+    if args.turn is not None:
+        player.seek(args.turn)
+
+    pygame.init()
+    try:
+        player.run()
+    finally:
+        pygame.quit()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
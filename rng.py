@@ -0,0 +1,93 @@
+import itertools
+import operator
+import numpy as np
+
+
+class Stream(object):
+    """Random numbers of NumPy generator, drawn in blocks.
+
+    Has methods of random.Random used by simulation, so it is passed as rg
+    wherever generator is expected. Uniforms are generated block_size at
+    a time and handed out by iterator, independent streams for workers or
+    parts of board are made by spawn from SeedSequence of stream.
+    """
+
+    def __init__(self, seed=None, block_size=4096):
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+
+        self.sequence = seed
+        self.generator = np.random.Generator(np.random.PCG64(seed))
+        self.block_size = block_size
+        self.start = None
+        self.block = None
+        self.chain(iter(()))
+
+    def blocks(self):
+        while True:
+            # state before block is enough to draw it again, see setstate
+            self.start = self.generator.bit_generator.state
+            self.block = iter(self.generator.random(self.block_size).tolist())
+            yield self.block
+
+    def chain(self, block):
+        """Hands out rest of block, then following blocks."""
+        uniforms = itertools.chain(
+            block,
+            itertools.chain.from_iterable(self.blocks())
+        )
+        # bound method of iterator is cheapest call giving next uniform
+        self.random = uniforms.__next__
+
+    def spawn(self, count):
+        """Returns count of independent streams."""
+        return [Stream(x, self.block_size) for x in self.sequence.spawn(count)]
+
+    def randint(self, a, b):
+        return a + int(self.random() * (b - a + 1))
+
+    def uniform(self, a, b):
+        return a + (b - a) * self.random()
+
+    def choice(self, seq):
+        return seq[int(self.random() * len(seq))]
+
+    def shuffle(self, x):
+        random = self.random
+        for i in reversed(range(1, len(x))):
+            j = int(random() * (i + 1))
+            x[i], x[j] = x[j], x[i]
+
+    def getrandbits(self, k):
+        # taken from generator directly, so blocks are not wasted
+        words = self.generator.bit_generator.random_raw((k + 63) // 64)
+        value = 0
+        for word in words.tolist():
+            value = (value << 64) | word
+
+        return value >> (64 * len(words) - k)
+
+    def getstate(self):
+        """Returns state as dict of plain values, which JSON can hold."""
+        used = 0
+        if self.block is not None:
+            used = self.block_size - operator.length_hint(self.block)
+
+        return dict(
+            start=self.start,
+            used=used,
+            state=self.generator.bit_generator.state
+        )
+
+    def setstate(self, state):
+        """Sets state returned by getstate."""
+        self.start = state["start"]
+        self.block = None
+        if self.start is not None:
+            self.generator.bit_generator.state = self.start
+            self.block = iter(self.generator.random(self.block_size).tolist())
+            for _ in range(state["used"]):
+                next(self.block)
+
+        self.chain(self.block or iter(()))
+        self.generator.bit_generator.state = state["state"]
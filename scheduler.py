@@ -0,0 +1,32 @@
+import collections
+
+
+class Scheduler(object):
+    """Actions of creatures kept by turn in which they are due.
+
+    Only turns having anything scheduled have their bucket, so creatures
+    without plans cost nothing. Creatures are referred by handles of
+    Board.creatures, so actions of removed creatures are simply dropped.
+    """
+
+    def __init__(self):
+        self.buckets = collections.defaultdict(list)
+
+    def __len__(self):
+        return sum(len(x) for x in self.buckets.values())
+
+    def schedule(self, turn, handle, action):
+        """Plans action of creature for given turn."""
+        self.buckets[turn].append((handle, action))
+
+    def due(self, turn):
+        """Removes and returns (handle, action) pairs due in turn."""
+        return self.buckets.pop(turn, [])
+
+    def events(self):
+        """Returns all planned (turn, handle, action), in order of turns."""
+        return [
+            (turn, handle, action)
+            for turn in sorted(self.buckets)
+            for handle, action in self.buckets[turn]
+        ]
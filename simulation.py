@@ -0,0 +1,245 @@
+import yaml
+import importlib
+import numpy as np
+import checkpoint
+from creatures import Worm
+from rng import Stream
+
+from board import Board
+from stats import JsonLinesSink, Reporter
+
+
+def load_config(config_path):
+    """Returns options read from YAML file."""
+    with open(config_path) as f:
+        return yaml.safe_load(f)
+
+
+class Simulation(object):
+    """Board with its population, advanced turn by turn without any UI."""
+
+    def __init__(self, options, ui_queue=None, seed=None, framebuffer=None,
+                 resume=None):
+        self.options = options
+        self.ui_queue = ui_queue
+        self.framebuffer = framebuffer
+        self.seed = seed if seed is not None else options.get("seed")
+        self.rg = Stream(self.seed)
+        self.turn = 0
+        self.engine = None
+        self.reporter = None
+        self.checkpointer = None
+        self.instrumentation = None
+        self.resume = resume
+
+    def load_class(self, definition):
+        """Returns class described by module and class name."""
+        mod = importlib.import_module(definition["module"])
+        return getattr(mod, definition["class"])
+
+    def init_board(self):
+        backend = self.options["board"].get("backend")
+        if backend:
+            board_class = self.load_class(self.options["boards"][backend])
+        else:
+            board_class = Board
+
+        self.board = board_class(
+            options=self.options["board"],
+            ui_queue=self.ui_queue,
+            rg=self.rg,
+            framebuffer=self.framebuffer
+        )
+
+        workers = self.options.get("engine", dict()).get("workers", 1)
+        if workers > 1:
+            from parallel import ParallelEngine
+            from world import ArrayWorld
+            if not isinstance(self.board, ArrayWorld):
+                raise ValueError(
+                    "engine with {} workers needs array backend, not {}".format(
+                        workers, backend or "dense"
+                    )
+                )
+            self.engine = ParallelEngine(self.board, workers)
+
+    def init(self):
+        """Prepares board, from checkpoint when resuming."""
+        self.init_board()
+        if self.resume:
+            self.restore(self.resume)
+            # restored board is already in recording of original run
+            self.init_recorder()
+        else:
+            self.init_recorder()
+            self.init_population()
+        self.init_statistics()
+        self.init_checkpoints()
+        self.init_instrumentation()
+
+    def init_population(self):
+        for item in self.options.get("initial_populations"):
+            ps_def = self.options["position_strategies"][item["position"]["strategy"]]
+            obj_class = self.load_class(ps_def)
+            obj = obj_class(board=self.board, options=item["position"])
+            statics = item["genes"] if "genes" in item else dict()
+
+            for position in obj.sample(item["count"]):
+                self.board.put(Worm(statics=statics, rg=self.rg), position)
+
+        self.board.flush()
+
+    def init_statistics(self):
+        options = self.options.get("statistics")
+        if not options or not options.get("path"):
+            return
+
+        sink_class = self.load_class(self.options["statistics_sinks"][options["sink"]])
+        self.reporter = Reporter(
+            # records of resumed run continue file of original one
+            sink=sink_class(options["path"], mode="a" if self.resume else "w"),
+            every=options.get("every"),
+            interval=options.get("interval")
+        )
+        if self.resume:
+            self.reporter.last_turn = self.report_turn
+
+    def init_recorder(self):
+        options = self.options.get("recording")
+        if not options or not options.get("path"):
+            return
+
+        from recorder import Recorder
+        self.board.recorder = Recorder(
+            path=options["path"],
+            width=self.board.width,
+            height=self.board.height,
+            keyframe_every=options.get("keyframe_every", 100),
+            resume_turn=self.turn if self.resume else None
+        )
+
+    def init_checkpoints(self):
+        options = self.options.get("checkpoint")
+        if not options or not options.get("every"):
+            return
+
+        self.checkpointer = checkpoint.Checkpointer(
+            path=options["path"],
+            every=options["every"]
+        )
+
+    def init_instrumentation(self):
+        options = self.options.get("instrumentation")
+        if not options or not options.get("enabled"):
+            return
+
+        from instrumentation import Instrumentation
+        # records of phases are nested, which only JSON lines can hold
+        if options.get("sink", "jsonl") != "jsonl":
+            raise ValueError("instrumentation is written only by jsonl sink")
+
+        self.instrumentation = Instrumentation(
+            sink=JsonLinesSink(options["path"]),
+            every=options.get("every", 100),
+            profile_every=options.get("profile_every", 0),
+            profile_path=options.get("profile_path", "profile")
+        )
+        self.instrumentation.install(self.board)
+        self.instrumentation.start(self.turn)
+
+    def state(self):
+        """Returns state needed to continue simulation as dict of arrays."""
+        state = self.board.state()
+        state.update(checkpoint.rng_state("board", self.rg))
+        state.update(
+            turn=np.array(self.turn),
+            backend=np.array(type(self.board).__name__),
+            width=np.array(self.board.width),
+            height=np.array(self.board.height),
+            report_turn=np.array(
+                self.reporter.last_turn if self.reporter else self.turn
+            ),
+        )
+        if self.engine is not None:
+            state.update(self.engine.state())
+
+        return state
+
+    def restore(self, path):
+        """Sets board and population to state saved in checkpoint."""
+        state = checkpoint.read(path)
+        if str(state["backend"]) != type(self.board).__name__:
+            raise ValueError("checkpoint was saved by {} backend".format(
+                state["backend"]
+            ))
+        if (int(state["width"]), int(state["height"])) != (
+            self.board.width, self.board.height
+        ):
+            raise ValueError("checkpoint was saved for board {}x{}".format(
+                state["width"], state["height"]
+            ))
+
+        self.board.restore(state)
+        checkpoint.set_rng_state("board", self.rg, state)
+        if self.engine is not None:
+            self.engine.restore(state)
+        elif "strip_rng" in state:
+            raise ValueError(
+                "checkpoint was saved with different number of workers"
+            )
+
+        self.turn = int(state["turn"])
+        self.report_turn = int(state["report_turn"])
+        self.board.flush()
+
+    def step(self):
+        """Performs one turn."""
+        self.turn += 1
+        if self.engine is not None:
+            self.engine.tick()
+        else:
+            self.board.tick()
+        self.board.flush()
+
+        if self.reporter is not None:
+            self.reporter.report(self.turn, self.board.stats)
+
+        if self.checkpointer is not None and self.checkpointer.due(self.turn):
+            self.checkpointer.save(self)
+
+        if self.instrumentation is not None:
+            self.instrumentation.tick(self.turn)
+
+    def run(self, turns):
+        """Initializes board and performs turns until given turn number."""
+        self.init()
+
+        while self.turn < turns:
+            self.step()
+
+        self.close()
+        return self.summary()
+
+    def close(self):
+        """Releases resources held by simulation."""
+        if self.checkpointer is not None:
+            self.checkpointer.wait()
+
+        if self.instrumentation is not None:
+            self.instrumentation.close(self.turn)
+
+        if self.engine is not None:
+            self.engine.close()
+
+        if self.reporter is not None:
+            self.reporter.report(self.turn, self.board.stats, force=True)
+            self.reporter.close()
+
+        if self.board.recorder is not None:
+            self.board.recorder.close()
+
+    def summary(self):
+        """Returns state of simulation as dict."""
+        result = dict(turn=self.turn, seed=self.seed)
+        result.update(self.board.census())
+        return result
@@ -0,0 +1,185 @@
+import csv
+import json
+import time
+import collections
+import numpy as np
+import helpers as h
+
+
+class Statistics(object):
+    """Counters of creatures on board, updated on every change of state.
+
+    Population is counted per field code (see helpers.encode_field), so
+    Board keeps it right just by reporting replaced codes. Events are
+    counted since last call of reset.
+    """
+
+    # dropped_births are children without free id, see ArrayWorld.allocate
+    EVENTS = ["births", "deaths", "kills", "meals", "dropped_births"]
+
+    def __init__(self):
+        self.codes = collections.Counter()
+        self.starving = 0
+        self.events = collections.Counter()
+
+    def replace(self, old, new):
+        """Records change of field code from old to new."""
+        if old:
+            self.codes[old] -= 1
+        if new:
+            self.codes[new] += 1
+
+        # creature died in place
+        if old & 2 and new and not new & 2:
+            self.events["deaths"] += 1
+
+    def starve(self, before, after):
+        """Records change of creature running out of energy."""
+        if before != after:
+            self.starving += 1 if after else -1
+
+    def event(self, name):
+        self.events[name] += 1
+
+    def merge(self, other):
+        """Adds counters of other statistics to these."""
+        self.codes.update(other.codes)
+        self.starving += other.starving
+        self.events.update(other.events)
+
+    def reset(self):
+        """Clears counters of events."""
+        self.events.clear()
+
+    def state(self):
+        """Returns counters as dict of arrays."""
+        return dict(
+            stats_codes=np.array(list(self.codes.keys()), dtype=np.int64),
+            stats_counts=np.array(list(self.codes.values()), dtype=np.int64),
+            stats_starving=np.array(self.starving),
+            stats_events=np.array([self.events[x] for x in self.EVENTS]),
+        )
+
+    def restore(self, state):
+        """Sets counters from dict made by state."""
+        self.codes = collections.Counter(dict(zip(
+            state["stats_codes"].tolist(),
+            state["stats_counts"].tolist()
+        )))
+        self.starving = int(state["stats_starving"])
+        self.events = collections.Counter(dict(zip(
+            self.EVENTS,
+            state["stats_events"].tolist()
+        )))
+
+    def census(self):
+        return dict(
+            total=sum(self.codes.values()),
+            alive=sum(v for code, v in self.codes.items() if code & 2),
+            no_energy=self.starving
+        )
+
+    def population(self):
+        """Returns counts of alive creatures and carrion by species, gender."""
+        result = collections.defaultdict(lambda: dict(alive=0, carrion=0))
+        for code, count in self.codes.items():
+            alive, gender, species = h.decode_field(code)
+            key = (species, gender)
+            result[key]["alive" if alive else "carrion"] += count
+
+        return [
+            dict(species=species, gender=gender, **result[(species, gender)])
+            for species, gender in sorted(result)
+        ]
+
+    def record(self):
+        """Returns all counters as dict."""
+        result = self.census()
+        result["carrion"] = result["total"] - result["alive"]
+        result["population"] = self.population()
+        for name in self.EVENTS:
+            result[name] = self.events[name]
+
+        return result
+
+
+class JsonLinesSink(object):
+    """Writes every record as JSON object in its own line."""
+
+    def __init__(self, path, mode="w"):
+        self.file = open(path, mode)
+
+    def write(self, record):
+        self.file.write(json.dumps(record, sort_keys=True) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class CsvSink(object):
+    """Writes records as CSV, one row per species and gender of record."""
+
+    FIELDS = [
+        "turn", "turns", "time", "total", "alive", "carrion", "no_energy",
+    ] + Statistics.EVENTS + [
+        "species", "gender", "species_alive", "species_carrion",
+    ]
+
+    def __init__(self, path, mode="w"):
+        self.file = open(path, mode)
+        self.writer = csv.DictWriter(self.file, fieldnames=self.FIELDS)
+        if mode == "w":
+            self.writer.writeheader()
+
+    def write(self, record):
+        for item in record["population"]:
+            row = dict((k, v) for k, v in record.items() if k in self.FIELDS)
+            row.update(
+                species=item["species"],
+                gender=item["gender"],
+                species_alive=item["alive"],
+                species_carrion=item["carrion"]
+            )
+            self.writer.writerow(row)
+
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class Reporter(object):
+    """Sends statistics to sink every given number of turns or seconds."""
+
+    def __init__(self, sink, every=None, interval=None):
+        self.sink = sink
+        self.every = every
+        self.interval = interval
+        self.last_turn = 0
+        self.last_time = time.time()
+
+    def due(self, turn):
+        if self.every and turn - self.last_turn >= self.every:
+            return True
+
+        if self.interval and time.time() - self.last_time >= self.interval:
+            return True
+
+        return False
+
+    def report(self, turn, statistics, force=False):
+        """Writes record of statistics if it is time to do so."""
+        if turn == self.last_turn or not (force or self.due(turn)):
+            return
+
+        record = dict(turn=turn, turns=turn - self.last_turn, time=time.time())
+        record.update(statistics.record())
+        self.sink.write(record)
+
+        statistics.reset()
+        self.last_turn = turn
+        self.last_time = record["time"]
+
+    def close(self):
+        self.sink.close()
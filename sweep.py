@@ -0,0 +1,250 @@
+import os
+import sys
+import csv
+import copy
+import json
+import time
+import random
+import argparse
+import itertools
+import collections
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from simulation import Simulation, load_config
+
+
+def set_path(options, path, value):
+    """Sets value in nested options at dotted path, e.g. board.width.
+
+    Parts which are numbers index lists, so initial_populations.0.count
+    is count of first population.
+    """
+    parts = path.split(".")
+    target = options
+    for part in parts[:-1]:
+        key = int(part) if isinstance(target, list) else part
+        if isinstance(target, dict) and key not in target:
+            target[key] = dict()
+        target = target[key]
+
+    last = parts[-1]
+    target[int(last) if isinstance(target, list) else last] = value
+
+
+def draw(rg, description):
+    """Returns random value of parameter described by spec of search."""
+    if "choice" in description:
+        return rg.choice(description["choice"])
+    if "randint" in description:
+        return rg.randint(*description["randint"])
+    if "uniform" in description:
+        return rg.uniform(*description["uniform"])
+    if "bits" in description:
+        # statics of gene, as list of given number of bits
+        return [rg.randint(0, 1) for _ in range(description["bits"])]
+
+    raise ValueError("unknown parameter description {}".format(description))
+
+
+def variants(spec):
+    """Returns list of parameter sets described by grid and random search."""
+    result = []
+
+    grid = spec.get("grid")
+    if grid:
+        paths = sorted(grid)
+        for values in itertools.product(*[grid[x] for x in paths]):
+            result.append(collections.OrderedDict(zip(paths, values)))
+
+    search = spec.get("random")
+    if search:
+        rg = random.Random(search.get("seed"))
+        paths = sorted(search["parameters"])
+        for _ in range(search["samples"]):
+            result.append(collections.OrderedDict(
+                (x, draw(rg, search["parameters"][x])) for x in paths
+            ))
+
+    return result or [collections.OrderedDict()]
+
+
+def run_key(params, seed):
+    """Returns identifier of run, the same across invocations."""
+    return json.dumps(dict(params=params, seed=seed), sort_keys=True)
+
+
+def run(base, params, seed, turns, seconds, every):
+    """Runs single variant and returns its results."""
+    options = copy.deepcopy(base)
+    for path, value in params.items():
+        set_path(options, path, value)
+    # sweep collects its own results
+    for name in ["statistics", "recording", "checkpoint", "instrumentation"]:
+        options[name] = None
+
+    simulation = Simulation(options=options, seed=seed)
+    simulation.init()
+
+    curve = [simulation.board.census()]
+    started = time.time()
+    while simulation.turn < turns:
+        if seconds and time.time() - started >= seconds:
+            break
+
+        simulation.step()
+        if every and simulation.turn % every == 0:
+            curve.append(simulation.board.census())
+
+    elapsed = time.time() - started
+    simulation.close()
+
+    species = collections.Counter()
+    for item in simulation.board.stats.population():
+        species[item["species"]] += item["alive"]
+
+    result = dict(
+        key=run_key(params, seed),
+        params=params,
+        seed=seed,
+        turns=simulation.turn,
+        seconds=elapsed,
+        turns_per_second=simulation.turn / elapsed if elapsed else None,
+        species_alive=dict((str(k), v) for k, v in sorted(species.items())),
+        surviving_species=sum(1 for v in species.values() if v),
+        curve=curve
+    )
+    result.update(simulation.board.census())
+    return result
+
+
+def failed(params, seed, error):
+    """Returns result of run which raised error."""
+    return dict(
+        key=run_key(params, seed),
+        params=params,
+        seed=seed,
+        error="{}: {}".format(type(error).__name__, error),
+        species_alive=dict()
+    )
+
+
+def finished(path):
+    """Returns results already written to output, skipping broken lines.
+
+    Unfinished last line of interrupted sweep is cut off the file, so
+    results appended later start on line of their own.
+    """
+    results = []
+    if not os.path.exists(path):
+        return results
+
+    with open(path, "rb+") as f:
+        data = f.read()
+        complete = data.rfind(b"\n") + 1
+        if complete < len(data):
+            f.truncate(complete)
+
+    for line in data[:complete].decode("utf-8").splitlines():
+        try:
+            results.append(json.loads(line))
+        except ValueError:
+            pass
+
+    return results
+
+
+def write_table(path, results):
+    """Writes results as CSV, one row per run with flattened parameters."""
+    params = sorted(set(k for x in results for k in x["params"]))
+    species = sorted(set(k for x in results for k in x["species_alive"]))
+    fields = params + [
+        "seed", "turns", "seconds", "turns_per_second",
+        "total", "alive", "no_energy", "surviving_species",
+    ] + ["species_{}_alive".format(x) for x in species] + ["error"]
+
+    with open(path, "w") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        for result in results:
+            row = dict((k, json.dumps(v)) for k, v in result["params"].items())
+            row.update((k, result.get(k)) for k in fields if k in result)
+            row.update(
+                ("species_{}_alive".format(k), v)
+                for k, v in result["species_alive"].items()
+            )
+            writer.writerow(row)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Runs simulations for grid or random variants of config."
+    )
+    parser.add_argument("spec", help="YAML with grid and/or random search")
+    parser.add_argument("--config", default=None,
+                        help="base YAML config, overrides one named in spec")
+    parser.add_argument("--output", default="sweep.jsonl",
+                        help="results, one JSON per line, runs found there are skipped")
+    parser.add_argument("--table", default="sweep.csv")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="processes, all cores by default")
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    args = parse_args(argv)
+    spec = load_config(args.spec)
+    base = load_config(args.config or spec["config"])
+
+    results = finished(args.output)
+    done = set(x["key"] for x in results)
+
+    runs = [
+        (params, seed)
+        for params in variants(spec)
+        for seed in spec.get("seeds", [None])
+        if run_key(params, seed) not in done
+    ]
+    print("{} runs, {} already done".format(len(runs) + len(done), len(done)))
+
+    with open(args.output, "a") as output:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            futures = dict(
+                (executor.submit(
+                    run, base, params, seed,
+                    spec.get("turns", 1000),
+                    spec.get("seconds"),
+                    spec.get("every", 10)
+                ), (params, seed))
+                for params, seed in runs
+            )
+
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # e.g. populations not fitting board of variant, other
+                    # runs go on and failure is kept as result
+                    result = failed(*futures[future] + (e,))
+
+                output.write(json.dumps(result, sort_keys=True) + "\n")
+                output.flush()
+                results.append(result)
+                if "error" in result:
+                    print("{} seed {}: failed, {}".format(
+                        json.dumps(result["params"]),
+                        result["seed"],
+                        result["error"]
+                    ))
+                    continue
+
+                print("{} seed {}: {} alive, {:.1f} turns/s".format(
+                    json.dumps(result["params"]),
+                    result["seed"],
+                    result["alive"],
+                    result["turns_per_second"] or 0.0
+                ))
+
+    write_table(args.table, results)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,9 @@
+import benchmark
+from simulation import load_config
+
+
+def test_kernel_agrees_with_array():
+    means, mismatches = benchmark.conformance(
+        load_config("config.yaml"), "array", "kernel", range(4), 50
+    )
+    assert not mismatches
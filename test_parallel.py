@@ -0,0 +1,51 @@
+import copy
+import numpy as np
+import checkpoint
+from simulation import Simulation, load_config
+
+TURNS = 60
+
+
+def options(backend, workers):
+    result = load_config("config.yaml")
+    result["board"]["backend"] = backend
+    result["engine"]["workers"] = workers
+    result["statistics"] = None
+    return result
+
+
+def run(options, turns, resume=None, save=None):
+    """Returns state of simulation after turns, writing checkpoint of turn
+    given by save on the way."""
+    simulation = Simulation(copy.deepcopy(options), seed=3, resume=resume)
+    simulation.init()
+    while simulation.turn < turns:
+        simulation.step()
+        if save is not None and simulation.turn == save[0]:
+            checkpoint.write(save[1], simulation.state())
+
+    state = simulation.state()
+    simulation.close()
+    return state
+
+
+def assert_same(a, b):
+    assert sorted(a) == sorted(b)
+    for name in a:
+        assert np.array_equal(a[name], b[name]), name
+
+
+def check_repeatable(backend, path):
+    base = options(backend, 2)
+    full = run(base, TURNS, save=(TURNS // 2, path))
+
+    assert_same(full, run(base, TURNS))
+    assert_same(full, run(base, TURNS, resume=path))
+
+
+def test_array_workers_repeatable(tmp_path):
+    check_repeatable("array", str(tmp_path / "checkpoint.npz"))
+
+
+def test_kernel_workers_repeatable(tmp_path):
+    check_repeatable("kernel", str(tmp_path / "checkpoint.npz"))
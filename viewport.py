@@ -0,0 +1,233 @@
+import math
+import numpy as np
+
+# most pixels of board behind one pixel of screen which are looked at,
+# larger reductions take every n-th field first
+MAX_FACTOR = 2
+# zoom is 2 ** level screen pixels per field
+MAX_LEVEL = 4
+REDUCTIONS = ("mean", "majority")
+
+
+def block_reduce(pixels, factor, how="mean"):
+    """Returns (w, h, 3) pixels reduced to one per factor x factor block.
+
+    Partial blocks at edges are completed by repeating last fields. Mean
+    averages colors, majority takes the most common color of non-black
+    fields, so sparse populations stay visible when zoomed out. Fields
+    at the same place of every block are handled as one array, so work
+    grows with factor ** 2, or factor ** 4 for majority.
+    """
+    if factor == 1:
+        # always a copy, callers draw into result
+        return np.array(pixels)
+
+    w, h = pixels.shape[:2]
+    bw, bh = -(-w // factor), -(-h // factor)
+    if (bw * factor, bh * factor) != (w, h):
+        pixels = np.pad(
+            pixels,
+            ((0, bw * factor - w), (0, bh * factor - h), (0, 0)),
+            mode="edge"
+        )
+    parts = [pixels[x::factor, y::factor] for x in range(factor)
+             for y in range(factor)]
+
+    if how == "mean":
+        total = np.zeros((bw, bh, 3), dtype=np.uint16)
+        for part in parts:
+            total += part
+        return (total // len(parts)).astype(np.uint8)
+
+    if how == "majority":
+        codes = [
+            (x[..., 0].astype(np.int32) << 16) |
+            (x[..., 1].astype(np.int32) << 8) |
+            x[..., 2]
+            for x in parts
+        ]
+        best = np.zeros((bw, bh), dtype=np.int32)
+        most = np.zeros((bw, bh), dtype=np.uint8)
+        for code in codes:
+            count = np.zeros((bw, bh), dtype=np.uint8)
+            for other in codes:
+                count += code == other
+            count[code == 0] = 0
+            more = count > most
+            np.copyto(best, code, where=more)
+            np.copyto(most, count, where=more)
+
+        return np.stack(
+            [(best >> 16) & 255, (best >> 8) & 255, best & 255], axis=-1
+        ).astype(np.uint8)
+
+    raise ValueError("unknown reduction {}".format(how))
+
+
+def overview(pixels, step, how="mean"):
+    """Returns pixels reduced step times, looking at most at MAX_FACTOR ** 2
+    fields per result pixel, so cost depends on size of result only."""
+    factor = min(step, MAX_FACTOR)
+    stride = step // factor
+    return block_reduce(pixels[::stride, ::stride], factor, how)
+
+
+class Viewport(object):
+    """Visible part of board, with zoom and minimap of whole board.
+
+    Board is given as (width, height, 3) pixels, e.g. framebuffer or copy
+    kept by renderer. Zoomed in, fields of visible region are repeated,
+    zoomed out, visible region is block reduced. Minimap shows whole board
+    reduced to minimap pixels with rectangle of visible region. Only
+    visible fields and fields sampled for minimap are read, so drawing
+    costs the same for any size of board.
+    """
+
+    def __init__(self, board_width, board_height, width, height,
+                 minimap=0, reduce="mean"):
+        if reduce not in REDUCTIONS:
+            raise ValueError("unknown reduction {}".format(reduce))
+
+        self.board_width = board_width
+        self.board_height = board_height
+        self.width = width
+        self.height = height
+        self.reduce = reduce
+
+        # greatest level at which whole board fits into window
+        ratio = max(board_width / float(width), board_height / float(height))
+        self.fit_level = min(-int(math.ceil(math.log(ratio, 2))), MAX_LEVEL)
+        self.min_level = min(self.fit_level, 0)
+
+        self.minimap_step = 0
+        minimap = min(minimap, width, height)
+        if minimap:
+            ratio = max(board_width, board_height) / float(minimap)
+            self.minimap_step = 2 ** max(int(math.ceil(math.log(ratio, 2))), 0)
+
+        self.level = 0
+        self.x = 0.0
+        self.y = 0.0
+
+    @property
+    def zoom(self):
+        """Returns screen pixels per field."""
+        return 2.0 ** self.level
+
+    def span(self):
+        """Returns number of fields visible along both axes."""
+        return (
+            int(math.ceil(self.width / self.zoom)),
+            int(math.ceil(self.height / self.zoom))
+        )
+
+    def clamp(self):
+        span_x, span_y = self.span()
+        self.x = min(max(self.x, 0.0), max(self.board_width - span_x, 0))
+        self.y = min(max(self.y, 0.0), max(self.board_height - span_y, 0))
+
+    def fit(self):
+        """Zooms so whole board is visible and as big as possible."""
+        self.level = self.fit_level
+        self.x = self.y = 0.0
+
+    def center(self, cell):
+        """Moves view so cell is in its middle."""
+        span_x, span_y = self.span()
+        self.x = cell[0] - span_x / 2.0
+        self.y = cell[1] - span_y / 2.0
+        self.clamp()
+
+    def pan(self, dx, dy):
+        """Moves view by given number of screen pixels."""
+        self.x += dx / self.zoom
+        self.y += dy / self.zoom
+        self.clamp()
+
+    def zoom_at(self, change, point):
+        """Changes level by change, keeping field under point in place."""
+        cell = self.cell(point)
+        self.level = min(max(self.level + change, self.min_level), MAX_LEVEL)
+        self.x = cell[0] - point[0] / self.zoom
+        self.y = cell[1] - point[1] / self.zoom
+        self.clamp()
+
+    def cell(self, point):
+        """Returns field of board under point of screen."""
+        return self.x + point[0] / self.zoom, self.y + point[1] / self.zoom
+
+    def visible(self):
+        """Returns (x0, y0, x1, y1) of visible fields, end exclusive."""
+        span_x, span_y = self.span()
+        x0, y0 = int(self.x), int(self.y)
+        return (
+            x0, y0,
+            min(x0 + span_x, self.board_width),
+            min(y0 + span_y, self.board_height)
+        )
+
+    def contains(self, xs, ys):
+        """Checks if any of fields given by arrays of coordinates is visible."""
+        x0, y0, x1, y1 = self.visible()
+        return bool(np.any((xs >= x0) & (xs < x1) & (ys >= y0) & (ys < y1)))
+
+    def region(self, pixels):
+        """Returns visible fields as screen pixels, at most window big."""
+        x0, y0, x1, y1 = self.visible()
+        if self.level >= 0:
+            scale = 2 ** self.level
+            image = pixels[x0:x1, y0:y1].repeat(scale, axis=0)
+            image = image.repeat(scale, axis=1)
+        else:
+            image = overview(pixels[x0:x1, y0:y1], 2 ** -self.level, self.reduce)
+
+        return image[:self.width, :self.height]
+
+    def minimap(self, pixels):
+        """Returns whole board reduced by minimap_step, with visible region
+        outlined."""
+        image = overview(pixels, self.minimap_step, self.reduce)
+
+        step = self.minimap_step
+        x0, y0, x1, y1 = self.visible()
+        x0, y0 = x0 // step, y0 // step
+        x1 = min((x1 - 1) // step, image.shape[0] - 1)
+        y1 = min((y1 - 1) // step, image.shape[1] - 1)
+        image[x0:x1 + 1, [y0, y1]] = 255
+        image[[x0, x1], y0:y1 + 1] = 255
+        return image
+
+    def minimap_origin(self):
+        """Returns screen point of top left corner of minimap."""
+        return self.width - -(-self.board_width // self.minimap_step), 0
+
+    @property
+    def minimap_shown(self):
+        # at least level whole board is visible, minimap would repeat it
+        return bool(self.minimap_step) and self.level > self.fit_level
+
+    def minimap_cell(self, point):
+        """Returns field shown at point of minimap, None outside of it."""
+        if not self.minimap_shown:
+            return None
+
+        left, top = self.minimap_origin()
+        x = (point[0] - left) * self.minimap_step
+        y = (point[1] - top) * self.minimap_step
+        if 0 <= x < self.board_width and 0 <= y < self.board_height:
+            return x, y
+
+        return None
+
+    def draw(self, pixels):
+        """Returns (width, height, 3) frame of window."""
+        frame = np.zeros((self.width, self.height, 3), dtype=np.uint8)
+        image = self.region(pixels)
+        frame[:image.shape[0], :image.shape[1]] = image
+
+        if self.minimap_shown:
+            image = self.minimap(pixels)
+            left, top = self.minimap_origin()
+            frame[left:left + image.shape[0], top:top + image.shape[1]] = image
+
+        return frame
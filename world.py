@@ -0,0 +1,569 @@
+import helpers as h
+import numpy as np
+from board import Board
+from creatures import MASKED_MOVES, MOVES, Worm
+
+
+class ArrayWorld(Board):
+    """Board keeping state of worms in columns indexed by creature id.
+
+    Fields hold ids of creatures (-1 when free) instead of objects, and every
+    piece of state which Worm keeps in attributes lives in a NumPy column.
+    Turn of single creature follows Worm.turn rule by rule, on Python lists
+    copied from columns for the tick and choosing moves from masks directly.
+    """
+
+    EMPTY = -1
+    INITIAL_CAPACITY = 1024
+
+    STATE = [
+        ("health", np.float64),
+        ("energy", np.float64),
+        ("fear", np.float64),
+        ("age", np.int64),
+        ("born_at", np.int64),
+        ("genome", np.uint64),
+        ("material", np.uint64),
+        ("x", np.int32),
+        ("y", np.int32),
+        ("ticked", np.int64),
+        ("direction", np.int8),
+        ("died", np.bool_),
+        ("used", np.bool_),
+    ]
+
+    def __init__(self, options, ui_queue=None, rg=None, framebuffer=None):
+        super(ArrayWorld, self).__init__(
+            options=options,
+            ui_queue=ui_queue,
+            rg=rg,
+            framebuffer=framebuffer
+        )
+
+        self.description = Worm.genes_description()
+        self.bits = Worm.gh().count
+        assert(self.bits <= 64)
+        self.colors = self.gene("species")["choices"]
+        self.genders = self.gene("gender")["choices"]
+
+        self.capacity = 0
+        self.top = 0
+        self.released = []
+        self.reserved = None
+        self.resize(options.get("capacity", self.INITIAL_CAPACITY))
+
+    def create_fields(self):
+        return np.full((self.width, self.height), self.EMPTY, dtype=np.int32)
+
+    def gene(self, name):
+        """Returns description of gene."""
+        for item in self.description:
+            if item["name"] == name:
+                return item
+
+    def columns(self):
+        """Returns names and types of all columns."""
+        result = list(self.STATE)
+        for item in self.description:
+            if "choices" not in item:
+                result.append((item["name"], np.float64))
+            elif item["name"] == "eats_own_carrion":
+                result.append((item["name"], np.bool_))
+            else:
+                result.append((item["name"], np.int8))
+
+        return result
+
+    def resize(self, capacity, zeros=np.zeros):
+        """Grows all columns to capacity."""
+        for name, dtype in self.columns():
+            column = zeros(capacity, dtype=dtype)
+            if self.capacity:
+                column[:self.capacity] = getattr(self, name)
+            setattr(self, name, column)
+
+        self.capacity = capacity
+
+    def share(self, zeros):
+        """Moves columns and grids to arrays created by zeros.
+
+        Columns get capacity for creature on every field, as shared arrays
+        can't grow once other processes use them.
+        """
+        self.resize(self.width * self.height, zeros=zeros)
+        self.top = self.capacity
+
+        for name in ["fields", "codes"]:
+            grid = getattr(self, name)
+            shared = zeros(grid.shape, dtype=grid.dtype)
+            shared[:] = grid
+            setattr(self, name, shared)
+
+    def allocate(self):
+        """Returns id for new creature, None when there is none left."""
+        if not self.released and self.reserved is not None:
+            # only ids from reserved slice may be taken by this process
+            start, step = self.reserved.start, self.reserved.step
+            free = np.flatnonzero(~self.used[self.reserved]) * step + start
+            self.released = free[::-1].tolist()
+
+        if self.released:
+            return self.released.pop()
+
+        if self.reserved is not None:
+            return None
+
+        if self.top == self.capacity:
+            self.resize(self.capacity * 2)
+
+        self.top += 1
+        return self.top - 1
+
+    def state(self):
+        """Returns state of board and its creatures as dict of arrays."""
+        state = dict(
+            turns=np.array(self.turns),
+            top=np.array(self.top),
+            released=np.array(self.released, dtype=np.int64),
+            fields=self.fields.copy(),
+            codes=self.codes.copy(),
+        )
+        for name, _ in self.columns():
+            state[name] = getattr(self, name)[:self.top].copy()
+
+        state.update(self.stats.state())
+        return state
+
+    def restore(self, state):
+        """Sets empty board to state made by ArrayWorld.state."""
+        self.turns = int(state["turns"])
+        self.top = int(state["top"])
+        if self.top > self.capacity:
+            self.resize(self.top)
+
+        for name, _ in self.columns():
+            getattr(self, name)[:self.top] = state[name]
+
+        self.released = state["released"].tolist()
+        self.fields[:] = state["fields"]
+        self.codes[:] = state["codes"]
+        self.masks = None
+        self.stats.restore(state)
+
+        for i in self.creatures:
+            self.paint(self.position(i), self.color(i))
+
+    @property
+    def creatures(self):
+        """Returns ids of creatures on board."""
+        return np.flatnonzero(self.used[:self.top]).tolist()
+
+    @creatures.setter
+    def creatures(self, value):
+        # Board.__init__ assigns list, ids are derived from used column
+        pass
+
+    def spawn(self, genes, position):
+        """Creates creature with genome at position and returns its id."""
+        i = self.allocate()
+        if i is None:
+            return None
+
+        self.assign([i], [genes])
+
+        self.health[i] = self.max_health[i]
+        self.energy[i] = self.max_energy[i]
+        self.fear[i] = 0.0
+        self.age[i] = 0
+        self.born_at[i] = -1
+        self.direction[i] = 0
+        self.ticked[i] = self.turns
+        self.died[i] = False
+        self.used[i] = True
+
+        x, y = position
+        self.x[i] = x
+        self.y[i] = y
+        self.fields[x, y] = i
+        self.mark(position, self.code(i))
+        self.stats.starve(False, self.energy[i] == 0.0)
+        self.paint(position, self.color(i))
+
+        return i
+
+    def assign(self, ids, genomes):
+        """Stores genomes of creatures and their decoded genes."""
+        data = Worm.gh().decode_batch(genomes)
+
+        for item in self.description:
+            value = data[item["name"]]
+            if item["name"] == "eats_own_carrion":
+                value = np.asarray(item["choices"])[value]
+            elif item["name"] == "max_age":
+                value = (value * 1000.0).astype(np.int64)
+            getattr(self, item["name"])[ids] = value
+
+        self.genome[ids] = genomes
+
+    def is_free(self, position):
+        x, y = position
+        return (
+            self.is_correct_position(position) and
+            self.fields[x, y] == self.EMPTY
+        )
+
+    def at(self, position):
+        x, y = position
+        i = self.fields[x, y]
+        return None if i == self.EMPTY else int(i)
+
+    def position(self, i):
+        return (int(self.x[i]), int(self.y[i]))
+
+    def put(self, creature, position):
+        """Puts new creature on board, copying its state to columns."""
+        return self.spawn(creature.genes, position)
+
+    def remove(self, position):
+        x, y = position
+        i = self.fields[x, y]
+        if self.reserved is None:
+            self.used[i] = False
+            self.released.append(int(i))
+        else:
+            # other workers look for free ids of their slices meanwhile, so
+            # id is freed by ParallelEngine once all of them finished phase
+            self.removed.append(int(i))
+            self.ticked[i] = self.turns
+        self.fields[x, y] = self.EMPTY
+        if self.codes.item(x, y) & 2:
+            self.stats.event("deaths")
+        self.stats.starve(self.energy[i] == 0.0, False)
+        self.mark(position, 0)
+        self.paint(position, (0, 0, 0))
+
+    def check_out(self, i):
+        x, y = self.position(i)
+        self.fields[x, y] = self.EMPTY
+        self.mark((x, y), 0)
+        self.paint((x, y), (0, 0, 0))
+
+    def check_in(self, i):
+        x, y = self.position(i)
+        self.fields[x, y] = i
+        self.mark((x, y), self.code(i))
+        self.paint((x, y), self.color(i))
+
+    def tick(self):
+        self.turns += 1
+        self.refresh()
+
+        ids = self.creatures
+        if self.visit_order == "random":
+            self.rg.shuffle(ids)
+
+        self.deliver(self.born_at[:self.top])
+        self.tick_ids(ids)
+
+    def tick_region(self, start, stop):
+        """Performs turn of creatures standing on fields with x in [start, stop).
+
+        Creatures which already had their turn are skipped, so creature
+        entering region from neighbouring one does not act twice.
+        """
+        self.scan(start, stop)
+
+        ids = self.fields[start:stop].ravel()
+        ids = ids[ids != self.EMPTY]
+        self.deliver(self.born_at[ids], ids)
+        self.tick_ids(ids.tolist())
+
+    def deliver(self, born_at, ids=None):
+        """Gives birth for creatures whose born_at is due in this turn.
+
+        Column of turns works as schedule, so only mothers whose time has
+        come are visited.
+        """
+        due = np.flatnonzero(born_at == self.turns)
+        if ids is not None:
+            due = ids[due]
+
+        for i in due.tolist():
+            self.born(i)
+
+    def tick_ids(self, ids):
+        """Performs turn of creatures with ids, in order."""
+        if self.reserved is not None:
+            # columns are shared with other workers, see ParallelEngine
+            self.turns_of(ids)
+            return
+
+        # Python lists are much faster than arrays to read and write one
+        # value at a time, so turns work on lists made for this tick
+        columns = self.unpack()
+        try:
+            self.turns_of(ids)
+        finally:
+            self.pack(columns)
+
+    def unpack(self):
+        """Replaces columns by lists, returns columns for pack."""
+        columns = dict()
+        for name, _ in self.columns():
+            columns[name] = getattr(self, name)
+            setattr(self, name, columns[name].tolist())
+
+        return columns
+
+    def pack(self, columns):
+        """Copies lists back to columns made by unpack and restores them."""
+        for name, column in columns.items():
+            column[:] = getattr(self, name)
+            setattr(self, name, column)
+
+    def turns_of(self, ids):
+        for i in ids:
+            # creature could be eaten or moved earlier in this turn
+            if not self.used[i] or self.ticked[i] == self.turns:
+                continue
+
+            self.ticked[i] = self.turns
+
+            if not self.alive(i):
+                self.die(i)
+                continue
+
+            self.turn(i)
+            self.age[i] += 1
+
+            # code of field has to stop showing creature as alive right away
+            if not self.alive(i):
+                self.die(i)
+
+    # Rules below mirror Worm, with creature id in place of self.
+
+    def color(self, i):
+        return self.colors[self.species[i]] if self.alive(i) else (50, 50, 50)
+
+    def alive(self, i):
+        return self.health[i] > 0.0 and self.age[i] < self.max_age[i]
+
+    def young(self, i):
+        return self.age[i] <= self.max_age[i] * 0.13
+
+    def procreation_able(self, i):
+        return (
+            self.age[i] >= (self.max_age[i] * 0.18) and
+            self.age[i] <= (self.max_age[i] * 0.45)
+        )
+
+    def is_pregnant(self, i):
+        return self.born_at[i] >= 0
+
+    def code(self, i):
+        return h.encode_field(
+            self.alive(i),
+            int(self.gender[i]),
+            int(self.species[i])
+        )
+
+    def destinations(self, i, mask):
+        x, y = self.position(i)
+        return [(x + dx, y + dy) for dx, dy in MASKED_MOVES[mask]]
+
+    def pick(self, position, mask):
+        """Returns random destination selected by mask, like rg.choice of
+        destinations, without building them."""
+        dx, dy = self.rg.choice(MASKED_MOVES[mask])
+        return position[0] + dx, position[1] + dy
+
+    # masks are bits of moves, see Board.neighbourhood
+
+    def possible_food(self, i, masks):
+        free, nonfree, alive, same, opposite = masks
+        food = nonfree & ~alive
+
+        if not self.eats_own_carrion[i]:
+            food &= ~same
+
+        return food
+
+    def possible_partners(self, i, masks):
+        free, nonfree, alive, same, opposite = masks
+        x, y = self.position(i)
+        return [
+            (x + dx, y + dy)
+            for dx, dy in MASKED_MOVES[nonfree & alive & same & opposite]
+            if self.want_partner(self.fields[x + dx, y + dy])
+        ]
+
+    def possible_victims(self, i, masks):
+        free, nonfree, alive, same, opposite = masks
+        return nonfree & alive & ~same
+
+    def want_food(self, i, free):
+        return self.energy[i] < (0.4 * self.max_energy[i]) or not free
+
+    def want_procreation(self, i):
+        return (
+            self.genders[self.gender[i]] == 'male' and
+            self.procreation_able(i) and
+            h.probability(self.temperament[i], self.rg)
+        )
+
+    def want_partner(self, i):
+        return (
+            self.procreation_able(i) and
+            h.probability(self.temperament[i], self.rg) and
+            not self.is_pregnant(i)
+        )
+
+    def want_move(self, i):
+        return h.probability(self.mobility[i], self.rg) and self.energy[i] > 0.0
+
+    def want_attack(self, i, free):
+        if self.young(i):
+            return False
+
+        if h.probability(self.aggression[i], self.rg):
+            return True
+
+        if h.probability(self.fear[i], self.rg):
+            return True
+
+        return self.want_food(i, free)
+
+    def drain(self, i, times=1):
+        impact = 0.005 * self.max_energy[i] * times
+        starving = self.energy[i] == 0.0
+        self.energy[i] = max(self.energy[i] - impact, 0.0)
+        self.stats.starve(starving, self.energy[i] == 0.0)
+
+    def attack(self, i, pos):
+        j = self.at(pos)
+
+        offensive = self.strength[i] * (self.health[i] / self.max_health[i])
+        defensive = self.strength[j] * (self.health[j] / self.max_health[j])
+
+        if offensive > defensive or self.young(j):
+            impact = offensive
+            if not self.young(j):
+                impact -= defensive
+
+            impact = max(0.0, impact)
+            self.health[j] = max(
+                0.0,
+                self.health[j] - (self.max_health[j] * impact)
+            )
+            self.fear[j] = min(self.fear[j] + 0.3, 1.0)
+
+            if not self.alive(j):
+                self.check_in(j)
+                self.stats.event("kills")
+        else:
+            self.drain(j, 3)
+
+    def procreate(self, i, pos):
+        j = self.at(pos)
+
+        if not self.want_partner(j):
+            return
+
+        self.accept_genetic_material(j, self.genome[i])
+
+    def accept_genetic_material(self, i, material):
+        assert(self.genders[self.gender[i]] == 'female')
+        assert(not self.is_pregnant(i))
+        self.material[i] = material
+        # column holds turn of birth, see Creature.schedule
+        self.born_at[i] = self.turns + max(int(self.max_age[i] * 0.05), 1)
+
+    def eat(self, i, pos):
+        j = self.at(pos)
+        starving = self.energy[i] == 0.0
+        self.energy[i] = min(
+            self.max_energy[i],
+            self.energy[i] + self.energy[j] + 0.5
+        )
+        self.stats.starve(starving, self.energy[i] == 0.0)
+        self.remove(pos)
+        self.stats.event("meals")
+
+    def die(self, i):
+        if not self.died[i]:
+            self.died[i] = True
+            self.check_in(i)
+
+    def move(self, i, destination):
+        self.check_out(i)
+        self.x[i], self.y[i] = destination
+        self.check_in(i)
+
+    def born(self, i):
+        self.born_at[i] = -1
+
+        # dead mother never gives birth
+        targets = []
+        if self.alive(i):
+            targets = self.destinations(i, self.neighbourhood(self.position(i))[0])
+
+        if len(targets) >= 2:
+            self.rg.shuffle(targets)
+            children = h.crossover(
+                int(self.genome[i]),
+                int(self.material[i]),
+                self.bits,
+                self.rg
+            )
+            for n, x in enumerate(children):
+                x = h.mutate_bin(x, self.bits, rg=self.rg)
+                if self.spawn(x, targets[n]) is not None:
+                    self.stats.event("births")
+                else:
+                    # slice of ids reserved by worker is used up
+                    self.stats.event("dropped_births")
+
+    def turn(self, i):
+        self.fear[i] = max(self.fear[i] - 0.1, 0.0)
+
+        # regeneration
+        if self.energy[i] > 0:
+            self.health[i] = min(self.max_health[i], self.health[i] * 1.05)
+
+        # being hungry kills ;-)
+        if self.energy[i] == 0:
+            self.health[i] = max(
+                self.health[i] - 0.025 * self.max_health[i],
+                0.0
+            )
+
+        # nothing on board changes until creature acts
+        position = self.position(i)
+        masks = self.neighbourhood(position)
+        free = masks[0]
+
+        food = self.possible_food(i, masks)
+        if food and self.want_food(i, free):
+            self.eat(i, self.pick(position, food))
+            self.drain(i)
+            return
+
+        partners = self.possible_partners(i, masks)
+        if partners and self.want_procreation(i) and not self.want_food(i, free):
+            self.procreate(i, self.rg.choice(partners))
+            self.drain(i, 5)
+            return
+
+        victims = self.possible_victims(i, masks)
+        if victims and self.want_attack(i, free):
+            self.attack(i, self.pick(position, victims))
+            self.drain(i)
+            return
+
+        if free and self.want_move(i):
+            while not free & (1 << self.direction[i]):
+                self.direction[i] = self.rg.randint(0, len(MOVES) - 1)
+
+            dx, dy = MOVES[self.direction[i]]
+            self.move(i, (position[0] + dx, position[1] + dy))
+            self.drain(i)